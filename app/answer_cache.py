@@ -0,0 +1,213 @@
+"""
+Semantic answer cache for MuseAI.
+
+Hundreds of visitors ask near-identical questions about the same artifact
+("how old is this?", "how old is it?"). Generated answers are stored in a
+small SQLite file and served again when a new question about the same
+artifact, in the same language, is close enough in embedding space.
+
+- Key: embedding model + artifact_id + language, then the same question
+  after normalisation (get_exact, no embedding needed) or, failing that,
+  the nearest question by cosine similarity (>= ANSWER_CACHE_THRESHOLD).
+  The similarity lookup needs the question's embedding – an extra
+  embedding call for questions retrieval didn't embed anyway (known
+  artifact, lexical fast path); ANSWER_CACHE_SEMANTIC=0 keeps exact
+  matches only
+- Every answer remembers a hash of the RAG context it was generated from;
+  lookups only match the current hash, and if the artifact's context
+  changes (catalog edit, rebuild) its old answers are deleted when the
+  first new one is stored – lookups stay read-only
+- Entries expire after ANSWER_CACHE_TTL_SECONDS
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional
+
+from app.embedding_cache import normalize_text
+
+
+# ====== Config ======
+BASE_DIR = Path(__file__).resolve().parent.parent
+ANSWER_CACHE_PATH = Path(
+    os.getenv("ANSWER_CACHE_PATH", str(BASE_DIR / "data" / "answer_cache.sqlite"))
+)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "1") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+ANSWER_CACHE_MAX_PER_KEY = 200   # answers kept per (model, artifact, language)
+
+
+def context_hash(context: str) -> str:
+    return hashlib.sha256(context.encode("utf-8")).hexdigest()
+
+
+class AnswerKey(NamedTuple):
+    model: str                    # embedding model the vector comes from
+    artifact_id: Optional[int]    # None = free-form question (query-based RAG)
+    language: str
+    context_hash: str             # hash of the RAG context sent to the LLM
+    question: str
+    vector: Optional[np.ndarray] = None   # None = exact question matches only
+
+
+class AnswerCache:
+    """SQLite-backed store of generated answers, looked up by question similarity."""
+
+    def __init__(
+        self,
+        path: Path = ANSWER_CACHE_PATH,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        ttl_seconds: int = ANSWER_CACHE_TTL_SECONDS,
+    ):
+        self.path = Path(path)
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY,
+                model TEXT NOT NULL,
+                artifact_id INTEGER,
+                language TEXT NOT NULL,
+                context_hash TEXT NOT NULL,
+                question TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                created REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_answers_key ON answers(model, artifact_id, language)"
+        )
+        self._conn.commit()
+
+    def get_exact(self, key: AnswerKey) -> Optional[str]:
+        """
+        Stored answer for the same question (after normalisation), or None.
+        Only hits are counted: a miss here is followed by get().
+        """
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer FROM answers "
+                "WHERE model = ? AND artifact_id IS ? AND language = ? "
+                "AND context_hash = ? AND question = ? AND created >= ? "
+                "ORDER BY created DESC LIMIT 1",
+                (key.model, key.artifact_id, key.language, key.context_hash,
+                 normalize_text(key.question), cutoff),
+            ).fetchone()
+            if row is not None:
+                self.hits += 1
+        return row[0] if row is not None else None
+
+    def get(self, key: AnswerKey) -> Optional[str]:
+        """Stored answer for the most similar earlier question, or None."""
+        rows = []
+        if key.vector is not None:
+            cutoff = time.time() - self.ttl_seconds
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT vector, answer FROM answers "
+                    "WHERE model = ? AND artifact_id IS ? AND language = ? "
+                    "AND context_hash = ? AND created >= ? AND length(vector) > 0",
+                    (key.model, key.artifact_id, key.language, key.context_hash, cutoff),
+                ).fetchall()
+
+        best_answer, best_sim = None, self.threshold
+        if rows:
+            q = np.asarray(key.vector, dtype="float32")
+            q = q / (np.linalg.norm(q) or 1.0)
+            matrix = np.vstack([np.frombuffer(vector, dtype="float32") for vector, _ in rows])
+            sims = matrix @ q / np.maximum(np.linalg.norm(matrix, axis=1), 1e-12)
+            i = int(np.argmax(sims))
+            if sims[i] >= best_sim:
+                best_answer, best_sim = rows[i][1], float(sims[i])
+
+        with self._lock:
+            if best_answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return best_answer
+
+    def put(self, key: AnswerKey, answer: str):
+        # Stored without a vector, an answer is only found by get_exact()
+        blob = b"" if key.vector is None else np.asarray(key.vector, dtype="float32").tobytes()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answers "
+                "(model, artifact_id, language, context_hash, question, vector, answer, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key.model, key.artifact_id, key.language, key.context_hash,
+                 normalize_text(key.question), blob, answer, time.time()),
+            )
+            if key.artifact_id is not None:
+                # Answers generated before the artifact's context changed
+                # (same model / language only: the others are replaced on
+                # their own next put)
+                self._conn.execute(
+                    "DELETE FROM answers WHERE model = ? AND artifact_id = ? AND language = ? "
+                    "AND context_hash != ?",
+                    (key.model, key.artifact_id, key.language, key.context_hash),
+                )
+            # Expired entries everywhere, and the oldest beyond the per-key cap
+            self._conn.execute(
+                "DELETE FROM answers WHERE created < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._conn.execute(
+                "DELETE FROM answers WHERE id IN ("
+                "SELECT id FROM answers WHERE model = ? AND artifact_id IS ? AND language = ? "
+                "ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                (key.model, key.artifact_id, key.language, ANSWER_CACHE_MAX_PER_KEY),
+            )
+            self._conn.commit()
+
+    def invalidate(self, artifact_id: Optional[int] = None):
+        """Drop cached answers for one artifact, or everything if None."""
+        with self._lock:
+            if artifact_id is None:
+                self._conn.execute("DELETE FROM answers")
+            else:
+                self._conn.execute("DELETE FROM answers WHERE artifact_id = ?", (artifact_id,))
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_CACHE: Optional[AnswerCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Process-wide answer cache, opened on first use."""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = AnswerCache()
+    return _CACHE
@@ -0,0 +1,78 @@
+"""
+Embedding backends for MuseAI.
+
+rag.py talks to embeddings through the small `Embedder` protocol below, so
+retrieval, index builds and evals can run on:
+
+- vertex   – Vertex AI text-embedding-004 (default, needs network + GCP creds)
+- hashing  – deterministic feature-hashing embedder, pure numpy, offline
+- local    – a sentence-transformers model loaded from disk (optional dependency)
+
+Each backend has a `name` (stored with the index and used as the embedding
+cache key) and a `dim`.
+"""
+
+import hashlib
+import numpy as np
+
+from typing import List, Optional, Protocol
+
+from app.lexical import tokenize
+
+
+class Embedder(Protocol):
+    name: str
+    dim: Optional[int]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Return a 2D float32 array, one row per text."""
+        ...
+
+
+class HashingEmbedder:
+    """
+    Offline embedder: signed feature hashing of word unigrams + bigrams,
+    L2-normalised. Deterministic across processes and machines, so kiosks
+    and load tests need no remote calls. Lexical rather than semantic.
+    """
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+
+    def _features(self, text: str) -> List[str]:
+        tokens = tokenize(text)
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                h = int.from_bytes(digest, "little")
+                vectors[row, h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+class SentenceTransformerEmbedder:
+    """On-disk sentence-transformers model, run on CPU."""
+
+    def __init__(self, model_path: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError(
+                "EMBEDDING_BACKEND=local needs the sentence-transformers package. "
+                "Install it, or use EMBEDDING_BACKEND=hashing for a dependency-free backend."
+            ) from e
+
+        self.model = SentenceTransformer(model_path, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"local:{model_path}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = self.model.encode(texts, convert_to_numpy=True, show_progress_bar=False)
+        return np.asarray(vectors, dtype="float32")
@@ -0,0 +1,180 @@
+"""
+Persistent embedding cache for MuseAI.
+
+Visitors keep asking the same things ("what is this made of?", "how old is
+it?"), so query embeddings are stored in a small SQLite file and reused
+across sessions, processes and restarts.
+
+- Key: embedding model name + hash of the normalised text
+- Size cap with LRU eviction (least recently *used*, not inserted)
+- Hits are a read only: their last_used times are batched in memory and
+  written together every TOUCH_FLUSH_EVERY hits / TOUCH_FLUSH_SECONDS
+  (a crash loses a few recency updates, never vectors)
+- Hit / miss counters for this process
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+from pathlib import Path
+from typing import Dict, Optional
+
+
+# ====== Config ======
+BASE_DIR = Path(__file__).resolve().parent.parent
+CACHE_PATH = Path(
+    os.getenv("EMBEDDING_CACHE_PATH", str(BASE_DIR / "data" / "embedding_cache.sqlite"))
+)
+CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "50000"))
+TOUCH_FLUSH_EVERY = 256
+TOUCH_FLUSH_SECONDS = 30.0
+
+
+def normalize_text(text: str) -> str:
+    """Case-fold and collapse whitespace so trivial variants share a key."""
+    return " ".join(text.casefold().split())
+
+
+def cache_key(model_name: str, text: str) -> str:
+    raw = f"{model_name}\0{normalize_text(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """SQLite-backed LRU cache of float32 embedding vectors."""
+
+    def __init__(self, path: Path = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}   # key -> last_used not yet written
+        self._last_flush = time.time()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection per process, shared by Streamlit's script threads
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)"
+        )
+        self._conn.commit()
+        # Running row count (re-read whenever we evict; other processes may write too)
+        (self._count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+
+    def get(self, model_name: str, text: str) -> Optional[np.ndarray]:
+        key = cache_key(model_name, text)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            now = time.time()
+            self._touched[key] = now
+            self.hits += 1
+            if len(self._touched) >= TOUCH_FLUSH_EVERY or now - self._last_flush >= TOUCH_FLUSH_SECONDS:
+                self._flush_touches_locked()
+                self._conn.commit()
+
+        return np.frombuffer(row[0], dtype="float32").copy()
+
+    def put(self, model_name: str, text: str, vector: np.ndarray):
+        key = cache_key(model_name, text)
+        blob = np.asarray(vector, dtype="float32").tobytes()
+        now = time.time()
+        with self._lock:
+            inserted = self._conn.execute(
+                "INSERT OR IGNORE INTO embeddings (key, model, vector, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (key, model_name, blob, now),
+            ).rowcount
+            if inserted:
+                self._count += 1
+            else:
+                self._conn.execute(
+                    "UPDATE embeddings SET model = ?, vector = ?, last_used = ? WHERE key = ?",
+                    (model_name, blob, now, key),
+                )
+            if self._count > self.max_entries:
+                self._evict_locked()
+            self._conn.commit()
+
+    def _flush_touches_locked(self):
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                [(last_used, key) for key, last_used in self._touched.items()],
+            )
+            self._touched.clear()
+        self._last_flush = time.time()
+
+    def _evict_locked(self):
+        # Recent hits must be on disk before picking the least recently used
+        self._flush_touches_locked()
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                "SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            )
+        self._count = min(count, self.max_entries)
+
+    def flush(self):
+        """Write batched last_used updates now (e.g. before shutdown)."""
+        with self._lock:
+            self._flush_touches_locked()
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._touched.clear()
+            self._count = 0
+            self.hits = 0
+            self.misses = 0
+
+
+_CACHE: Optional[EmbeddingCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide cache instance, opened on first use."""
+    global _CACHE
+    if _CACHE is None:
+        with _CACHE_LOCK:
+            if _CACHE is None:
+                _CACHE = EmbeddingCache()
+    return _CACHE
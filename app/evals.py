@@ -5,7 +5,7 @@ import pandas as pd
 import numpy as np
 import argparse
 from pathlib import Path
-from app.rag import retrieve_artifacts
+from app.rag import retrieve_artifacts_batch
 
 ROOT_DIR = Path(__file__).resolve().parent.parent  
 sys.path.append(str(ROOT_DIR))
@@ -26,16 +26,21 @@ def build_retrieval_log(
     queries_path: Path,
     output_path: Path,
     k: int = 3,
+    mode: str = "dense",
 ):
+    # mode="dense" by default: every row then has an L2 distance as its score
+    # (lower is better) and there are always k rows. With "auto"/"hybrid"
+    # BM25 / fusion scores (higher is better) are mixed in – see `retrieval`.
     queries_df = pd.read_csv(queries_path)
     rows = []
 
-    for _, row in queries_df.iterrows():
+    # One embedding pass + one index.search for all queries
+    all_results = retrieve_artifacts_batch(queries_df["query"].tolist(), k=k, mode=mode)
+
+    for (_, row), results in zip(queries_df.iterrows(), all_results):
         query_id = row["query_id"]
         query_text = row["query"]
 
-        results = retrieve_artifacts(query_text, k=k)
-
         for rank, r in enumerate(results, start=1):
             rows.append({
                 "query_id": query_id,
@@ -43,6 +48,7 @@ def build_retrieval_log(
                 "rank": rank,
                 "retrieved_artifact_id": r["artifact_id"],
                 "score": r["score"],
+                "retrieval": r["retrieval"],
             })
 
     log_df = pd.DataFrame(rows)
@@ -196,20 +202,18 @@ We do this by:
 
 """
 import time
-import os
 import numpy as np
 import pandas as pd
-from typing import Dict
 from pathlib import Path
 
-import vertexai
-from vertexai.generative_models import GenerativeModel
-
-# ---- Import retrieval & embedding utilities (read-only use) ----
+# ---- Import retrieval, embedding & LLM utilities (read-only use) ----
 from app.rag import (
     build_context_for_artifact_id,
     embed_texts,
+    get_embedder,
 )
+from app.reasoning import get_llm
+from app.embedding_cache import get_embedding_cache
 
 # ============================================================
 # Environment & Paths
@@ -223,31 +227,8 @@ GROUND_TRUTH_PATH = DATA_DIR / "ground_truth.csv"
 ARTIFACTS_PATH = DATA_DIR / "artifacts.csv"
 OUTPUT_PATH = DATA_DIR / "grounding_eval.csv"
 
-GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID")
-GCP_LOCATION = os.getenv("GCP_LOCATION", "us-central1")
-LLM_MODEL_NAME = "gemini-2.0-flash-001"
-
-# ============================================================
-# Vertex / Gemini Setup (Evaluation Only)
-# ============================================================
-
-def init_vertex():
-    """
-    Initialize Vertex AI.
-    This mirrors your production setup but lives ONLY in evals.
-    """
-    if not GCP_PROJECT_ID:
-        raise RuntimeError("GCP_PROJECT_ID not set.")
-    vertexai.init(project=GCP_PROJECT_ID, location=GCP_LOCATION)
-
-
-def get_llm() -> GenerativeModel:
-    """
-    Return Gemini 2.0 Flash model.
-    """
-    init_vertex()
-    return GenerativeModel(LLM_MODEL_NAME)
-
+# Gemini: evals share the app's cached model handle (reasoning.get_llm),
+# so a grounding run doesn't re-initialise Vertex for every answer.
 
 # ============================================================
 # Evaluation-only Generation Function
@@ -436,28 +417,28 @@ def evaluate_grounding_effect() -> pd.DataFrame:
 # Embedding Cache
 # ============================================================
 
-# Cache to avoid re-embedding the same text repeatedly
-EMBEDDING_CACHE: Dict[str, np.ndarray] = {}
-
-
 def embed_with_cache(text: str, max_retries: int = 5) -> np.ndarray:
     """
     Embed text with:
-    - caching (Fix 1)
+    - the persistent on-disk embedding cache shared with retrieval (Fix 1)
     - retry + exponential backoff (Fix 3)
 
     This protects evaluation from Vertex API instability.
     """
 
+    cache = get_embedding_cache()
+    model_key = get_embedder().name
+
     # --- Return cached embedding if exists ---
-    if text in EMBEDDING_CACHE:
-        return EMBEDDING_CACHE[text]
+    cached = cache.get(model_key, text)
+    if cached is not None:
+        return cached
 
     # --- Retry loop ---
     for attempt in range(max_retries):
         try:
             embedding = embed_texts([text])[0]
-            EMBEDDING_CACHE[text] = embedding
+            cache.put(model_key, text, embedding)
             return embedding
 
         except Exception as e:
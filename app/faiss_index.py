@@ -0,0 +1,441 @@
+"""
+FAISS index factory + benchmark for MuseAI.
+
+rag.py used to hard-code IndexFlatL2 (exact brute-force scan). That is fine
+for a handful of artifacts but not for a multi-museum catalog, so the index
+type is now selectable:
+
+    flat      exact search (baseline)
+    ivf_flat  inverted lists over k-means cells       (nlist, nprobe)
+    hnsw      graph search                            (hnsw_m, ef_construction, ef_search)
+    ivf_pq    inverted lists + product quantisation   (nlist, nprobe, pq_m, pq_nbits)
+
+Vectors can also be stored compressed (quantization: sq_fp16 | sq8 | pq) and
+reduced with PCA before indexing (pca_dim) – see compression_report() for
+the memory saved and the recall it costs.
+
+Every index is keyed by artifact_id: IVF indexes store ids natively, flat and
+HNSW are wrapped in IndexIDMap2.
+"""
+
+import time
+import faiss
+import numpy as np
+
+from typing import Dict, List, Optional
+
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+QUANTIZATIONS = ("none", "sq_fp16", "sq8", "pq")
+
+_SQ_TYPES = {
+    "sq_fp16": faiss.ScalarQuantizer.QT_fp16,   # 2 bytes / dim
+    "sq8": faiss.ScalarQuantizer.QT_8bit,       # 1 byte / dim
+}
+
+DEFAULT_INDEX_PARAMS = {
+    "nlist": 256,            # IVF cells
+    "nprobe": 16,            # IVF cells visited per query
+    "hnsw_m": 32,            # HNSW neighbours per node
+    "ef_construction": 200,  # HNSW build-time beam width
+    "ef_search": 64,         # HNSW query-time beam width
+    "pq_m": 16,              # PQ sub-quantizers (must divide the dimension)
+    "pq_nbits": 8,           # bits per PQ code
+    "quantization": "none",  # sq_fp16 / sq8 for flat, ivf_flat, hnsw; pq for hnsw
+    #                          (ivf_pq is always product-quantised)
+    "pca_dim": None,         # reduce dimensionality with PCA before indexing
+}
+
+
+def resolve_index_params(params: Optional[Dict]) -> Dict:
+    """Defaults overlaid with the caller's tuning params."""
+    resolved = dict(DEFAULT_INDEX_PARAMS)
+    resolved.update(params or {})
+    return resolved
+
+
+# Params baked into the index when it is built, per index type (nprobe and
+# ef_search are query-time and can be changed on a built index)
+BUILD_PARAMS = {
+    "flat": ("quantization", "pca_dim"),
+    "ivf_flat": ("quantization", "pca_dim", "nlist"),
+    "hnsw": ("quantization", "pca_dim", "hnsw_m", "ef_construction"),
+    "ivf_pq": ("quantization", "pca_dim", "nlist", "pq_m", "pq_nbits"),
+}
+
+
+def build_layout(index_type: str, params: Optional[Dict]) -> Dict:
+    """The build-time part of `params` for `index_type`; an index can only be
+    updated in place if its layout matches the requested one."""
+    p = resolve_index_params(params)
+    keys = BUILD_PARAMS.get(index_type, ())
+    if index_type == "hnsw" and p["quantization"] == "pq":
+        keys += ("pq_m", "pq_nbits")
+    return {"index_type": index_type, **{key: p[key] for key in keys}}
+
+
+def _ivf_nlist(requested: int, n_train: int) -> int:
+    # k-means wants ~39 points per centroid; shrink nlist for small catalogs
+    return max(1, min(requested, n_train // 39))
+
+
+def _pq_nbits(requested: int, n_train: int) -> int:
+    # PQ training needs at least 2**nbits points per sub-quantizer
+    return min(requested, max(1, int(np.log2(max(n_train, 2)))))
+
+
+def effective_params(index_type: str, params: Optional[Dict], n_train: int) -> Dict:
+    """The params make_index() actually uses for `n_train` training vectors
+    (nlist and pq_nbits are shrunk for small training sets)."""
+    p = resolve_index_params(params)
+    if index_type in ("ivf_flat", "ivf_pq"):
+        p["nlist"] = _ivf_nlist(p["nlist"], n_train)
+        p["nprobe"] = min(p["nprobe"], p["nlist"])
+    if index_type == "ivf_pq" or p["quantization"] == "pq":
+        p["pq_nbits"] = _pq_nbits(p["pq_nbits"], n_train)
+    return p
+
+
+def index_build_params(index: faiss.Index, params: Optional[Dict]) -> Dict:
+    """`params` with nlist / nprobe / pq_nbits / ef_search read back from a built index."""
+    p = resolve_index_params(params)
+    core = _unwrap(index)
+    if isinstance(core, faiss.IndexIVF):
+        p["nlist"] = int(core.nlist)
+        p["nprobe"] = int(core.nprobe)
+    if isinstance(core, faiss.IndexIVFPQ):
+        p["pq_nbits"] = int(core.pq.nbits)
+    if isinstance(core, faiss.IndexHNSW):
+        p["ef_search"] = int(core.hnsw.efSearch)
+        storage = faiss.downcast_index(core.storage)
+        if isinstance(storage, faiss.IndexPQ):
+            p["pq_nbits"] = int(storage.pq.nbits)
+    return p
+
+
+def make_index(index_type: str, vectors: np.ndarray, params: Optional[Dict] = None) -> faiss.Index:
+    """
+    Build an empty (but trained, if needed) index for `vectors`.
+
+    `vectors` is only used for dimension + PCA/IVF/quantizer training; call
+    add_vectors() afterwards to actually insert them.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose one of {INDEX_TYPES}.")
+
+    p = resolve_index_params(params)
+    quant = p["quantization"]
+    if quant not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization '{quant}'. Choose one of {QUANTIZATIONS}.")
+    if index_type in ("flat", "ivf_flat") and quant == "pq":
+        # IndexPQ can't take ID selectors (metadata filters); IVF-PQ / HNSW-PQ can
+        raise ValueError("For product quantisation use index type 'ivf_pq' or 'hnsw'.")
+
+    n, raw_dim = vectors.shape
+    p = effective_params(index_type, p, n)
+    dim = p["pca_dim"] or raw_dim
+    if dim > raw_dim:
+        raise ValueError(f"pca_dim={dim} must be below the embedding dimension {raw_dim}.")
+    if p["pca_dim"] and dim > n:
+        # PCA can't find more components than it has training rows
+        raise ValueError(f"pca_dim={dim} needs at least {dim} training vectors, got {n}.")
+    if (quant == "pq" or index_type == "ivf_pq") and dim % p["pq_m"] != 0:
+        raise ValueError(f"pq_m={p['pq_m']} must divide the indexed dimension {dim}.")
+
+    if index_type == "flat":
+        if quant in _SQ_TYPES:
+            base = faiss.IndexScalarQuantizer(dim, _SQ_TYPES[quant])
+        else:
+            base = faiss.IndexFlatL2(dim)
+
+    elif index_type == "hnsw":
+        if quant in _SQ_TYPES:
+            base = faiss.IndexHNSWSQ(dim, _SQ_TYPES[quant], p["hnsw_m"])
+        elif quant == "pq":
+            base = faiss.IndexHNSWPQ(dim, p["pq_m"], p["hnsw_m"], p["pq_nbits"])
+        else:
+            base = faiss.IndexHNSWFlat(dim, p["hnsw_m"])
+        base.hnsw.efConstruction = p["ef_construction"]
+        base.hnsw.efSearch = p["ef_search"]
+
+    else:
+        nlist = p["nlist"]
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_pq":
+            base = faiss.IndexIVFPQ(quantizer, dim, nlist, p["pq_m"], p["pq_nbits"])
+        elif quant in _SQ_TYPES:
+            base = faiss.IndexIVFScalarQuantizer(quantizer, dim, nlist, _SQ_TYPES[quant])
+        else:
+            base = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        base.nprobe = p["nprobe"]
+
+    if p["pca_dim"]:
+        base = faiss.IndexPreTransform(faiss.PCAMatrix(raw_dim, dim), base)
+
+    if not base.is_trained:
+        base.train(vectors)
+
+    # IVF stores artifact_ids natively; everything else needs an id map
+    if index_type in ("flat", "hnsw"):
+        return faiss.IndexIDMap2(base)
+    return base
+
+
+def needs_training(index_type: str, params: Optional[Dict] = None) -> bool:
+    """
+    True if make_index() has to learn something from the vectors (IVF
+    centroids, PQ/SQ8 codebooks, PCA), so it should see a decent sample.
+    """
+    p = resolve_index_params(params)
+    return (
+        index_type in ("ivf_flat", "ivf_pq")
+        or p["quantization"] in ("sq8", "pq")
+        or bool(p["pca_dim"])
+    )
+
+
+def add_vectors(index: faiss.Index, vectors: np.ndarray, ids: np.ndarray):
+    index.add_with_ids(vectors, np.asarray(ids, dtype="int64"))
+
+
+def _unwrap(index: faiss.Index) -> faiss.Index:
+    """Strip IndexIDMap2 / IndexPreTransform wrappers down to the core index."""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexPreTransform):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def describe_index_type(index: faiss.Index) -> str:
+    """Map a loaded FAISS index back to one of INDEX_TYPES ('legacy' if positional)."""
+    core = _unwrap(index)
+    if isinstance(core, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(core, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(core, faiss.IndexIVF):
+        return "ivf_flat"
+    if core is index:
+        return "legacy"   # bare IndexFlatL2 from before artifact_id keys
+    return "flat"
+
+
+def is_keyed_by_artifact_id(index: faiss.Index) -> bool:
+    """False only for old positional IndexFlatL2 builds."""
+    return describe_index_type(index) != "legacy"
+
+
+def supports_remove(index: faiss.Index) -> bool:
+    return describe_index_type(index) in ("flat", "ivf_flat", "ivf_pq")
+
+
+def read_index_mmap(path: str) -> faiss.Index:
+    """
+    Open a saved index memory-mapped and read-only, so every worker process
+    on the host shares one page-cache copy instead of its own heap copy.
+
+    IVF files ("Iw..." header) map their inverted lists; flat/HNSW builds map
+    their flat code storage where this FAISS version supports it.
+    """
+    with open(path, "rb") as f:
+        fourcc = f.read(4)
+
+    if fourcc.startswith(b"Iw"):
+        flags = faiss.IO_FLAG_MMAP
+    else:
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    return faiss.read_index(path, flags | faiss.IO_FLAG_READ_ONLY)
+
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Tune query-time speed/recall on a loaded index."""
+    core = _unwrap(index)
+    if nprobe is not None and isinstance(core, faiss.IndexIVF):
+        core.nprobe = min(nprobe, core.nlist)
+    if ef_search is not None and isinstance(core, faiss.IndexHNSW):
+        core.hnsw.efSearch = ef_search
+
+
+def selector_search_params(index: faiss.Index, allowed_ids: np.ndarray, k: int = 3) -> faiss.SearchParameters:
+    """
+    SearchParameters that restrict a search to `allowed_ids` (FAISS labels).
+
+    The selector is applied inside the scan, so a filtered search only
+    computes distances for matching vectors instead of over-fetching and
+    filtering afterwards. Keeps the index's own nprobe; HNSW widens
+    efSearch for selective filters, since the graph walk skips non-matching
+    nodes and would otherwise run out of candidates.
+    """
+    sel = faiss.IDSelectorBatch(np.asarray(allowed_ids, dtype="int64"))
+    core = _unwrap(index)
+
+    if isinstance(core, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(sel=sel, nprobe=core.nprobe)
+    elif isinstance(core, faiss.IndexHNSW):
+        ef = core.hnsw.efSearch
+        selectivity = max(len(allowed_ids), 1) / max(index.ntotal, 1)
+        ef = int(min(max(ef, 4 * k / selectivity), max(index.ntotal, ef)))
+        params = faiss.SearchParametersHNSW(sel=sel, efSearch=ef)
+    else:
+        params = faiss.SearchParameters(sel=sel)
+
+    # The Python object must outlive the search call
+    params.sel_ref = sel
+    return params
+
+
+def stored_vectors(index: faiss.Index) -> np.ndarray:
+    """Raw vectors held by a flat index (IDMap2-wrapped or legacy)."""
+    inner = faiss.downcast_index(index.index) if describe_index_type(index) == "flat" else index
+    if not isinstance(inner, faiss.IndexFlat):
+        raise ValueError("Benchmarking needs a flat index build to read exact vectors from.")
+    return inner.reconstruct_n(0, inner.ntotal)
+
+
+def reconstruct_vectors(index: faiss.Index, ids: np.ndarray) -> np.ndarray:
+    """
+    Vectors stored under `ids` (artifact_ids) for any index type – exact for
+    flat builds, the decoded approximation for quantised / PCA builds.
+    """
+    core = _unwrap(index)
+    ivf = isinstance(core, faiss.IndexIVF)
+    if ivf:
+        # IVF only maps ids back to list entries with a direct map; build a
+        # temporary one (hashtable: artifact_ids aren't 0..n-1)
+        core.set_direct_map_type(faiss.DirectMap.Hashtable)
+    try:
+        return index.reconstruct_batch(np.asarray(ids, dtype="int64"))
+    finally:
+        if ivf:
+            core.set_direct_map_type(faiss.DirectMap.NoMap)
+
+
+def knn_graph(index: faiss.Index, ids: np.ndarray, k: int = 8, batch_size: int = 4096) -> np.ndarray:
+    """
+    Nearest-neighbour graph between the indexed vectors: row i holds the
+    artifact_ids of the k closest other vectors to ids[i], -1 padded.
+
+    Runs the index's own search over its stored vectors in batches, so it
+    costs one batched search per build and no embedding calls.
+    """
+    ids = np.asarray(ids, dtype="int64")
+    graph = np.full((len(ids), k), -1, dtype="int64")
+    if k <= 0 or index.ntotal < 2:
+        return graph
+
+    for start in range(0, len(ids), batch_size):
+        batch_ids = ids[start:start + batch_size]
+        _, labels = index.search(reconstruct_vectors(index, batch_ids), k + 1)
+        for row, (own_id, found) in enumerate(zip(batch_ids, labels)):
+            neighbours = [aid for aid in found if aid >= 0 and aid != own_id][:k]
+            graph[start + row, :len(neighbours)] = neighbours
+    return graph
+
+
+def index_memory_bytes(index: faiss.Index) -> int:
+    """Size of the serialized index, i.e. what a process holds in RAM."""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def _exact_recall(
+    index: faiss.Index,
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+) -> float:
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth_pos = exact.search(queries, k)
+    truth = ids[truth_pos]
+    _, found = index.search(queries, k)
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / (len(queries) * k)
+
+
+def sample_queries(vectors: np.ndarray, n_queries: int = 200, seed: int = 0) -> np.ndarray:
+    """Catalog vectors plus a little Gaussian noise, as stand-in queries."""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(vectors), size=n_queries, replace=True)
+    noise = rng.normal(scale=0.05 * float(vectors.std()), size=(n_queries, vectors.shape[1]))
+    return (vectors[picks] + noise).astype("float32")
+
+
+def compression_report(
+    index: faiss.Index,
+    vectors: np.ndarray,
+    ids: np.ndarray,
+    k: int = 10,
+    n_queries: int = 200,
+) -> Dict:
+    """
+    Memory of `index` vs plain float32 storage of `vectors`, and the recall@k
+    it keeps compared with exact search over the uncompressed vectors.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    k = min(k, len(vectors))
+    raw_bytes = int(vectors.nbytes)
+    index_bytes = index_memory_bytes(index)
+    queries = sample_queries(vectors, n_queries)
+
+    return {
+        "raw_float32_mb": raw_bytes / 1e6,
+        "index_mb": index_bytes / 1e6,
+        "memory_saved": 1 - index_bytes / raw_bytes if raw_bytes else 0.0,
+        f"recall@{k}": _exact_recall(index, vectors, np.asarray(ids), queries, k),
+    }
+
+
+# ====== Benchmark ======
+def benchmark_index_types(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    index_types: List[str] = INDEX_TYPES,
+    params: Optional[Dict] = None,
+) -> List[Dict]:
+    """
+    Compare index types against exact IndexFlatL2 search.
+
+    For each type reports build time, recall@k (overlap with the exact
+    top-k) and p50/p99 single-query latency in milliseconds.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    queries = np.ascontiguousarray(queries, dtype="float32")
+    ids = np.arange(len(vectors), dtype="int64")
+    k = min(k, len(vectors))
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    report = []
+    for index_type in index_types:
+        t0 = time.perf_counter()
+        try:
+            index = make_index(index_type, vectors, params)
+        except ValueError as e:
+            print(f"Skipping {index_type}: {e}")
+            continue
+        add_vectors(index, vectors, ids)
+        build_s = time.perf_counter() - t0
+
+        latencies = []
+        hits = 0
+        for qi in range(len(queries)):
+            q = queries[qi:qi + 1]
+            t0 = time.perf_counter()
+            _, found = index.search(q, k)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            hits += len(set(found[0]) & set(truth[qi]))
+
+        report.append({
+            "index_type": index_type,
+            "build_s": build_s,
+            f"recall@{k}": hits / (len(queries) * k),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+        })
+
+    return report
@@ -0,0 +1,354 @@
+"""
+Pre-generated FAQ answers for MuseAI.
+
+Most visitors ask a handful of the same open questions about every object
+("tell me about it", "what was it used for?", "who made it?"). An offline
+batch job answers those canonical questions for each artifact in en/fr/he,
+with exactly the prompt museai_reason() would use, and stores them in a
+small SQLite file keyed by (artifact_id, language, question_id). At
+runtime a question that matches a canonical one – same words after
+normalisation, or close in embedding space – is answered from the bank
+with no generation latency.
+
+- The job runs a bounded number of Gemini calls at a time and commits
+  every answer as it arrives, so an interrupted run picks up where it
+  stopped
+- Each answer remembers a hash of the artifact's context; if the catalog
+  entry changes, the old answer is ignored and the next run regenerates it
+
+    python app/faq_bank.py build --concurrency 4
+    python app/faq_bank.py stats
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+import numpy as np
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# --- make sure the project root is on sys.path (for `python app/faq_bank.py`) ---
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.answer_cache import context_hash
+from app.intents import normalize_question
+from app.rag import (
+    build_context_for_artifact_id,
+    embed_queries,
+    embed_query,
+    get_artifact,
+    get_embedder,
+    load_artifact_metadata,
+)
+
+
+# ====== Config ======
+BASE_DIR = ROOT_DIR
+FAQ_BANK_PATH = Path(os.getenv("FAQ_BANK_PATH", str(BASE_DIR / "data" / "faq_bank.sqlite")))
+FAQ_BANK_ENABLED = os.getenv("FAQ_BANK_ENABLED", "1") == "1"
+FAQ_MATCH_THRESHOLD = float(os.getenv("FAQ_MATCH_THRESHOLD", "0.88"))
+FAQ_CONCURRENCY = int(os.getenv("FAQ_CONCURRENCY", "4"))
+FAQ_MAX_RETRIES = 4
+FAQ_LANGUAGES = ("en", "fr", "he")
+
+# question_id -> phrasing per language. Where / material / age questions are
+# not here: the intent router answers those from the metadata directly.
+CANONICAL_QUESTIONS: Dict[str, Dict[str, str]] = {
+    "about": {
+        "en": "Tell me about this object.",
+        "fr": "Parle-moi de cet objet.",
+        "he": "ספר לי על החפץ הזה.",
+    },
+    "use": {
+        "en": "What was it used for?",
+        "fr": "À quoi servait-il ?",
+        "he": "למה השתמשו בו?",
+    },
+    "origin": {
+        "en": "Where does it come from?",
+        "fr": "D'où vient-il ?",
+        "he": "מאיפה הוא הגיע?",
+    },
+    "maker": {
+        "en": "Who made it?",
+        "fr": "Qui l'a fabriqué ?",
+        "he": "מי יצר אותו?",
+    },
+    "how_made": {
+        "en": "How was it made?",
+        "fr": "Comment a-t-il été fabriqué ?",
+        "he": "איך הוא נוצר?",
+    },
+    "significance": {
+        "en": "Why is it important?",
+        "fr": "Pourquoi est-il important ?",
+        "he": "למה הוא חשוב?",
+    },
+}
+
+
+# ====== Store ======
+class FaqBank:
+    """SQLite table of pre-generated answers per (artifact, language, question)."""
+
+    def __init__(self, path: Path = FAQ_BANK_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS faq (
+                artifact_id INTEGER NOT NULL,
+                language TEXT NOT NULL,
+                question_id TEXT NOT NULL,
+                context_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                answer TEXT NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (artifact_id, language, question_id)
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.commit()
+
+    def answers(self, artifact_id: int, language: str, ctx_hash: str) -> Dict[str, str]:
+        """question_id -> answer, for answers generated from this exact context."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT question_id, answer FROM faq "
+                "WHERE artifact_id = ? AND language = ? AND context_hash = ?",
+                (artifact_id, language, ctx_hash),
+            ).fetchall()
+        return dict(rows)
+
+    def put(
+        self,
+        artifact_id: int,
+        language: str,
+        question_id: str,
+        ctx_hash: str,
+        model: str,
+        answer: str,
+    ):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO faq "
+                "(artifact_id, language, question_id, context_hash, model, answer, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (artifact_id, language, question_id, ctx_hash, model, answer, time.time()),
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM faq").fetchone()
+            (artifacts,) = self._conn.execute(
+                "SELECT COUNT(DISTINCT artifact_id) FROM faq"
+            ).fetchone()
+        return {"answers": count, "artifacts": artifacts}
+
+
+_BANK: Optional[FaqBank] = None
+_BANK_LOCK = threading.Lock()
+
+
+def get_faq_bank() -> FaqBank:
+    """Process-wide FAQ bank, opened on first use."""
+    global _BANK
+    if _BANK is None:
+        with _BANK_LOCK:
+            if _BANK is None:
+                _BANK = FaqBank()
+    return _BANK
+
+
+# ====== Matching ======
+_PHRASINGS: Dict[str, str] = {
+    normalize_question(text): qid
+    for qid, by_language in CANONICAL_QUESTIONS.items()
+    for text in by_language.values()
+}
+
+# (embedder name, question_ids, unit vectors) – one row per phrasing
+_QUESTION_VECTORS: Optional[Tuple[str, List[str], np.ndarray]] = None
+_QUESTION_VECTORS_LOCK = threading.Lock()
+
+
+def _question_vectors() -> Tuple[List[str], np.ndarray]:
+    """Embeddings of every canonical phrasing, for the current embedder."""
+    global _QUESTION_VECTORS
+    name = get_embedder().name
+    cached = _QUESTION_VECTORS
+    if cached is None or cached[0] != name:
+        with _QUESTION_VECTORS_LOCK:
+            cached = _QUESTION_VECTORS
+            if cached is None or cached[0] != name:
+                qids = [qid for qid, by_lang in CANONICAL_QUESTIONS.items() for _ in by_lang]
+                texts = [t for by_lang in CANONICAL_QUESTIONS.values() for t in by_lang.values()]
+                vectors = embed_queries(texts)
+                vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                cached = (name, qids, vectors)
+                _QUESTION_VECTORS = cached
+    return cached[1], cached[2]
+
+
+def match_question(user_query: str, candidates: Iterable[str]) -> Optional[str]:
+    """The canonical question_id (among `candidates`) the query asks, or None."""
+    candidates = set(candidates)
+    qid = _PHRASINGS.get(normalize_question(user_query))
+    if qid is not None:
+        return qid if qid in candidates else None
+
+    try:
+        qids, vectors = _question_vectors()
+        q = embed_query(user_query)
+    except Exception as e:
+        print(f"[faq_bank.match_question] Skipping embedding match: {e}")
+        return None
+
+    sims = vectors @ (q / (np.linalg.norm(q) or 1.0))
+    best, best_sim = None, FAQ_MATCH_THRESHOLD
+    for qid, sim in zip(qids, sims):
+        if qid in candidates and sim >= best_sim:
+            best, best_sim = qid, float(sim)
+    return best
+
+
+def lookup_faq_answer(user_query: str, artifact_id: Optional[int], language: str) -> Optional[str]:
+    """Pre-generated answer for this question about this artifact, or None."""
+    if not FAQ_BANK_ENABLED or artifact_id is None or not FAQ_BANK_PATH.exists():
+        return None
+
+    ctx_hash = context_hash(build_context_for_artifact_id(artifact_id))
+    answers = get_faq_bank().answers(artifact_id, language, ctx_hash)
+    if not answers:
+        return None   # nothing banked for this artifact – skip the embedding
+    qid = match_question(user_query, answers)
+    return answers.get(qid) if qid else None
+
+
+# ====== Batch generation ======
+def _generate_with_retry(prompt: str, max_retries: int) -> str:
+    """One Gemini answer with exponential backoff."""
+    from app.reasoning import get_llm
+
+    for attempt in range(max_retries):
+        try:
+            return get_llm().generate_content(prompt).text.strip()
+        except Exception as e:
+            if attempt == max_retries - 1:
+                raise
+            wait_time = 2 ** attempt
+            print(
+                f"Generation failed (attempt {attempt + 1}/{max_retries}): {e}. "
+                f"Retrying in {wait_time}s..."
+            )
+            time.sleep(wait_time)
+
+
+def build_faq_bank(
+    artifact_ids: Optional[Sequence[int]] = None,
+    languages: Sequence[str] = FAQ_LANGUAGES,
+    concurrency: int = FAQ_CONCURRENCY,
+    refresh: bool = False,
+    max_retries: int = FAQ_MAX_RETRIES,
+) -> Dict[str, int]:
+    """
+    Generate the canonical answers for every artifact in artifacts.csv
+    (or `artifact_ids`) and language.
+
+    Answers already in the bank for the artifact's current context are
+    skipped unless refresh=True, so re-running after an interruption only
+    generates what is missing. Failed answers are reported and left for
+    the next run.
+    """
+    # reasoning imports this module for lookups, so import it lazily here
+    from app.reasoning import LLM_MODEL_NAME, build_prompt, build_rag_context
+
+    if artifact_ids is None:
+        artifact_ids = load_artifact_metadata()["artifact_id"].astype(int).tolist()
+
+    bank = get_faq_bank()
+    tasks = []
+    skipped = 0
+    for aid in artifact_ids:
+        if get_artifact(aid) is None:
+            print(f"Artifact {aid} is not in the vectorstore – rebuild the index first. Skipping.")
+            continue
+        ctx_hash = context_hash(build_context_for_artifact_id(aid))
+        for language in languages:
+            done = {} if refresh else bank.answers(aid, language, ctx_hash)
+            for qid in CANONICAL_QUESTIONS:
+                if qid in done:
+                    skipped += 1
+                else:
+                    tasks.append((aid, language, qid, ctx_hash))
+
+    print(f"FAQ bank: {len(tasks)} answers to generate, {skipped} already done.")
+
+    def generate(task) -> str:
+        aid, language, qid, _ = task
+        question = CANONICAL_QUESTIONS[qid][language]
+        prompt = build_prompt(question, build_rag_context(question, aid, language), language)
+        return _generate_with_retry(prompt, max_retries)
+
+    generated = failed = 0
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(generate, task): task for task in tasks}
+        for future in as_completed(futures):
+            aid, language, qid, ctx_hash = futures[future]
+            try:
+                answer = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"  artifact {aid} [{language}] {qid}: failed ({e})")
+                continue
+            bank.put(aid, language, qid, ctx_hash, LLM_MODEL_NAME, answer)
+            generated += 1
+            if generated % 50 == 0 or generated + failed == len(tasks):
+                print(f"  {generated + failed}/{len(tasks)} done")
+
+    elapsed = time.perf_counter() - start_time
+    if generated:
+        print(f"Generated {generated} answers in {elapsed:.1f}s ({generated / max(elapsed, 1e-9):.2f}/sec)")
+    if failed:
+        print(f"{failed} answer(s) failed; run the job again to retry them.")
+    return {"generated": generated, "skipped": skipped, "failed": failed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-generate MuseAI FAQ answers per artifact.")
+    sub = parser.add_subparsers(dest="command")
+
+    build = sub.add_parser("build", help="Generate missing answers (default).")
+    build.add_argument("--concurrency", type=int, default=FAQ_CONCURRENCY)
+    build.add_argument("--languages", nargs="+", choices=FAQ_LANGUAGES, default=list(FAQ_LANGUAGES))
+    build.add_argument("--artifact-id", dest="artifact_ids", type=int, nargs="+")
+    build.add_argument("--refresh", action="store_true", help="Regenerate answers already in the bank.")
+    sub.add_parser("stats", help="Count banked answers.")
+
+    args = parser.parse_args()
+    if args.command == "stats":
+        print(get_faq_bank().stats())
+    else:
+        build_faq_bank(
+            artifact_ids=getattr(args, "artifact_ids", None),
+            languages=getattr(args, "languages", FAQ_LANGUAGES),
+            concurrency=getattr(args, "concurrency", FAQ_CONCURRENCY),
+            refresh=getattr(args, "refresh", False),
+        )
+
+
+if __name__ == "__main__":
+    main()
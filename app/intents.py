@@ -0,0 +1,142 @@
+"""
+Rule-based intent router for MuseAI.
+
+A large share of visitor questions about a scanned artifact are one of
+"where is it?", "what is it made of?" or "how old is it?". Those are
+answered straight from the artifact's location / material / period
+columns with a localized template – milliseconds instead of a Gemini
+round-trip. Anything else (or a question that merely contains the same
+words, like "where was it found?") falls through to the LLM.
+
+Questions are matched whole, after normalisation, against short EN/FR/HE
+patterns; the answer is given in the visitor's current language whatever
+language the question was asked in.
+"""
+
+import os
+import re
+import unicodedata
+
+from typing import Dict, Optional
+
+
+# ====== Config ======
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "1") == "1"
+
+# intent -> metadata column it is answered from
+INTENT_FIELDS = {
+    "location": "location",
+    "material": "material",
+    "period": "period",
+}
+
+_IT_EN = r"(?:it|this|that|this (?:one|object|artifact|piece|item))"
+_IT_FR = r"(?:il|elle|t il|t elle|ce|ca|cet objet|cette piece|cette oeuvre|l objet)"
+_IT_HE = r"(?:זה|הוא|היא|החפץ הזה|הפריט הזה)"
+
+# Filler around the actual question ("so, ...", "... please")
+_LEAD = r"(?:(?:and|so|ok|okay|please|et|alors|dis moi)\s+)*"
+_TAIL = r"(?:\s+(?:please|s il vous plait|s il te plait|בבקשה))?"
+
+INTENT_PATTERNS = {
+    "location": [
+        # en
+        rf"where (?:is|s) {_IT_EN}(?: (?:located|displayed|exhibited|kept|on display))?",
+        rf"where can i (?:find|see) {_IT_EN}",
+        rf"(?:in )?which (?:room|gallery|hall) is {_IT_EN}(?: in)?",
+        # fr
+        rf"ou (?:est|se trouve|se situe)(?: {_IT_FR})?(?: expose| exposee)?",
+        r"ou (?:puis je|peut on) (?:le|la|l) (?:voir|trouver)",
+        rf"dans quelle salle (?:est|se trouve)(?: {_IT_FR})?",
+        # he
+        rf"(?:איפה|היכן) {_IT_HE}(?: נמצא| נמצאת| מוצג| מוצגת)?",
+        rf"באיזה (?:חדר|אולם) {_IT_HE}(?: נמצא| נמצאת)?",
+    ],
+    "material": [
+        rf"what (?:is|s) {_IT_EN} made (?:of|from|out of)",
+        rf"what (?:material|materials) (?:is|are) {_IT_EN}(?: made (?:of|from))?",
+        r"what (?:is|s) the material",
+        rf"(?:en|de) quoi (?:est|est ce que)(?: {_IT_FR})? (?:fait|faite|fabrique|fabriquee)",
+        rf"(?:c est )?en quoi(?: {_IT_FR})?",
+        r"quel (?:est le )?materiau(?: est ce)?",
+        rf"ממה {_IT_HE}(?: עשוי| עשויה)?",
+        rf"ממה (?:עשוי|עשויה) {_IT_HE}",
+    ],
+    "period": [
+        rf"how old is {_IT_EN}",
+        rf"(?:when|what (?:period|century|era|date)) (?:is|was|s) {_IT_EN}(?: (?:from|made|created|dated))?",
+        rf"when does {_IT_EN} date from",
+        rf"what (?:period|century|era) (?:does|did) {_IT_EN} come from",
+        r"quel age a t (?:il|elle)",
+        rf"de quand date(?: {_IT_FR})?",
+        r"(?:ca|ce|cela) date de quand",
+        rf"de quelle (?:epoque|periode)(?: (?:est|date)(?: {_IT_FR})?| s agit il)?",
+        rf"(?:בן|בת) כמה {_IT_HE}",
+        rf"מאיזו (?:תקופה|מאה)(?: {_IT_HE})?",
+        rf"מאיזה (?:תקופה|מאה)(?: {_IT_HE})?",
+        rf"מתי {_IT_HE} (?:נעשה|נעשתה|נוצר|נוצרה)",
+    ],
+}
+
+_COMPILED = {
+    intent: [re.compile(rf"{_LEAD}{p}{_TAIL}") for p in patterns]
+    for intent, patterns in INTENT_PATTERNS.items()
+}
+
+TEMPLATES = {
+    "en": {
+        "location": "{title} is displayed in {location}.",
+        "material": "{title} is made of {material}.",
+        "period": "{title} dates from {period}.",
+    },
+    "fr": {
+        "location": "L'objet « {title} » est exposé ici : {location}.",
+        "material": "L'objet « {title} » est fait du matériau suivant : {material}.",
+        "period": "L'objet « {title} » date de la période suivante : {period}.",
+    },
+    "he": {
+        "location": "„{title}“ מוצג ב: {location}.",
+        "material": "„{title}“ עשוי מ: {material}.",
+        "period": "„{title}“ מתוארך ל: {period}.",
+    },
+}
+
+_PUNCT_RE = re.compile(r"[^\w\s]", re.UNICODE)
+
+# Ligatures NFKD leaves alone ("œuvre" must match "oeuvre")
+_LIGATURES = str.maketrans({"œ": "oe", "æ": "ae"})
+
+
+def normalize_question(text: str) -> str:
+    """Case-fold, strip accents, ligatures and punctuation, collapse whitespace."""
+    text = unicodedata.normalize("NFKD", str(text).casefold().translate(_LIGATURES))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(_PUNCT_RE.sub(" ", text).split())
+
+
+def detect_intent(user_query: str) -> Optional[str]:
+    """'location' | 'material' | 'period' if the whole question is one of those, else None."""
+    q = normalize_question(user_query)
+    if not q:
+        return None
+    for intent, patterns in _COMPILED.items():
+        if any(p.fullmatch(q) for p in patterns):
+            return intent
+    return None
+
+
+def _value(value) -> Optional[str]:
+    # Missing CSV cells arrive as NaN/None
+    if not isinstance(value, str) or not value.strip():
+        return None
+    return value.strip()
+
+
+def answer_intent(intent: str, artifact: Dict, language: str) -> Optional[str]:
+    """Templated answer from the artifact's metadata, or None if the field is empty."""
+    value = _value(artifact.get(INTENT_FIELDS[intent]))
+    if value is None:
+        return None
+    title = _value(artifact.get("title")) or str(artifact.get("artifact_id"))
+    templates = TEMPLATES.get(language, TEMPLATES["en"])
+    return templates[intent].format(title=title, **{INTENT_FIELDS[intent]: value})
@@ -0,0 +1,156 @@
+"""
+Lexical (BM25) retrieval for MuseAI.
+
+Many visitor questions name the artifact word-for-word ("tell me about the
+bronze helmet"). Those are answered from an in-process BM25 index over
+title / short_label / base_context, with no embedding round-trip. Dense
+FAISS retrieval handles everything else, and the two result lists can be
+fused with Reciprocal Rank Fusion.
+"""
+
+import re
+import math
+import unicodedata
+
+from collections import Counter, defaultdict
+from typing import AbstractSet, Dict, List, Optional, Sequence, Tuple
+
+
+# Field weights: title words count 3x, label words 2x, description 1x
+FIELD_WEIGHTS = {"title": 3, "short_label": 2, "base_context": 1}
+
+# A BM25 hit is "strong" when it clears this score and beats the runner-up
+# by this ratio. Title phrases found verbatim in the question always are.
+STRONG_MIN_SCORE = 6.0
+STRONG_MARGIN = 1.5
+
+STOPWORDS = {
+    # en
+    "a", "an", "the", "of", "and", "or", "to", "in", "on", "at", "for", "with",
+    "is", "are", "was", "were", "it", "this", "that", "what", "who", "how",
+    "me", "about", "tell", "please", "can", "you", "from", "by", "its",
+    # fr
+    "le", "la", "les", "un", "une", "des", "de", "du", "et", "ou", "est",
+    "ce", "cet", "cette", "sur", "pour", "avec", "moi", "parle", "qui", "que",
+}
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case, strip accents, split on word characters, drop stopwords."""
+    text = unicodedata.normalize("NFKD", str(text).casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [t for t in _TOKEN_RE.findall(text) if t not in STOPWORDS]
+
+
+def _text(value) -> str:
+    # Missing CSV cells arrive as NaN/None
+    return value if isinstance(value, str) else ""
+
+
+class BM25Index:
+    """Okapi BM25 over the artifact metadata fields, keyed by artifact_id."""
+
+    def __init__(self, records: Sequence[Dict], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[int] = []
+        self.titles: Dict[int, Tuple[str, ...]] = {}
+        self.titles_by_first: Dict[str, List[int]] = defaultdict(list)
+        self.doc_len: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+
+        for doc_no, r in enumerate(records):
+            aid = int(r["artifact_id"])
+            counts: Counter = Counter()
+            for field, weight in FIELD_WEIGHTS.items():
+                for token in tokenize(_text(r.get(field))):
+                    counts[token] += weight
+
+            self.ids.append(aid)
+            title = tuple(tokenize(_text(r.get("title"))))
+            self.titles[aid] = title
+            if title:
+                self.titles_by_first[title[0]].append(aid)
+            self.doc_len.append(sum(counts.values()))
+            for token, tf in counts.items():
+                self.postings[token].append((doc_no, tf))
+
+        n_docs = max(len(self.ids), 1)
+        self.avg_len = sum(self.doc_len) / n_docs if self.doc_len else 0.0
+        self.idf = {
+            token: math.log(1 + (n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            for token, plist in self.postings.items()
+        }
+
+    def search(
+        self,
+        query: str,
+        k: int = 3,
+        allowed: Optional[AbstractSet[int]] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Top-k (artifact_id, bm25_score), best first. Zero scores are dropped.
+        `allowed` restricts scoring to those artifact_ids (metadata filters).
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        for token in set(tokenize(query)):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for doc_no, tf in self.postings[token]:
+                if allowed is not None and self.ids[doc_no] not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_no] / self.avg_len)
+                scores[doc_no] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(self.ids[doc_no], score) for doc_no, score in ranked]
+
+    def title_mentions(self, query: str) -> List[int]:
+        """artifact_ids whose full title appears as a phrase in the query."""
+        q = tokenize(query)
+        found = set()
+        for i, token in enumerate(q):
+            for aid in self.titles_by_first.get(token, ()):
+                title = self.titles[aid]
+                if tuple(q[i:i + len(title)]) == title:
+                    found.add(aid)
+        # Longest title first ("bronze helmet" beats "helmet")
+        return sorted(found, key=lambda aid: len(self.titles[aid]), reverse=True)
+
+    def strong_match(
+        self,
+        query: str,
+        k: int = 3,
+        allowed: Optional[AbstractSet[int]] = None,
+    ) -> List[Tuple[int, float]]:
+        """
+        Lexical results if the query clearly names an artifact, else [].
+        """
+        hits = self.search(query, k=max(k, 2), allowed=allowed)
+        mentioned = self.title_mentions(query)
+        if allowed is not None:
+            mentioned = [aid for aid in mentioned if aid in allowed]
+
+        if mentioned:
+            by_id = dict(hits)
+            top = [(aid, by_id.get(aid, 0.0)) for aid in mentioned]
+            rest = [h for h in hits if h[0] not in mentioned]
+            return (top + rest)[:k]
+
+        if not hits or hits[0][1] < STRONG_MIN_SCORE:
+            return []
+        if len(hits) > 1 and hits[0][1] < STRONG_MARGIN * hits[1][1]:
+            return []
+        return hits[:k]
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse several ranked id lists: score = sum(1 / (k + rank))."""
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, aid in enumerate(ranking, start=1):
+            fused[aid] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,170 @@
+"""
+Token budgets for MuseAI prompts.
+
+Long base_context fields used to go into the Gemini prompt untouched, so
+input size (and generation latency) depended on whichever artifacts were
+retrieved. Prompts are now assembled against a per-language token budget:
+
+- Context chunks arrive best first (retrieval order); whole chunks are
+  kept while they fit, the first one that doesn't is cut at a word
+  boundary, and the rest are dropped
+- Tokens are counted with tiktoken (cl100k_base). That is not Gemini's
+  tokenizer, so budgets are approximate; the real counts come back in
+  each response's usage_metadata and are logged next to the estimate
+- Without the tiktoken encoding file (offline kiosk), counts fall back to
+  UTF-8 bytes / 4, which over- rather than under-estimates
+"""
+
+import os
+import threading
+
+from collections import deque
+from typing import Dict, List, Optional
+
+
+# ====== Config ======
+TIKTOKEN_ENCODING = os.getenv("TIKTOKEN_ENCODING", "cl100k_base")
+
+# Whole-prompt input budget (instructions + context + question). French and
+# especially Hebrew need more tokens for the same instructions and question,
+# so they get more room to keep a similar amount of museum context.
+PROMPT_TOKEN_BUDGETS = {
+    "en": int(os.getenv("PROMPT_TOKEN_BUDGET_EN", "1200")),
+    "fr": int(os.getenv("PROMPT_TOKEN_BUDGET_FR", "1400")),
+    "he": int(os.getenv("PROMPT_TOKEN_BUDGET_HE", "1800")),
+}
+DEFAULT_PROMPT_TOKEN_BUDGET = PROMPT_TOKEN_BUDGETS["en"]
+
+MIN_TRIMMED_CHUNK_TOKENS = 40   # don't bother keeping a chunk cut shorter than this
+CHUNK_SEPARATOR = "\n---\n"
+USAGE_LOG_SIZE = 500            # recent requests kept for usage_stats()
+
+
+# ====== Token counting ======
+_ENCODING = None
+_ENCODING_LOADED = False
+_ENCODING_LOCK = threading.Lock()
+
+
+def _get_encoding():
+    """tiktoken encoding, loaded once; None if it can't be loaded (no network/cache)."""
+    global _ENCODING, _ENCODING_LOADED
+    if not _ENCODING_LOADED:
+        with _ENCODING_LOCK:
+            if not _ENCODING_LOADED:
+                try:
+                    import tiktoken
+                    _ENCODING = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+                except Exception as e:
+                    print(f"[prompt_budget] tiktoken unavailable, estimating tokens from bytes: {e}")
+                    _ENCODING = None
+                _ENCODING_LOADED = True
+    return _ENCODING
+
+
+def count_tokens(text: str) -> int:
+    enc = _get_encoding()
+    if enc is None:
+        return (len(text.encode("utf-8")) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens, at a word boundary, marked with '…'."""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    enc = _get_encoding()
+    if enc is None:
+        cut = text.encode("utf-8")[: max(max_tokens - 1, 0) * 4].decode("utf-8", errors="ignore")
+    else:
+        cut = enc.decode(enc.encode(text, disallowed_special=())[: max(max_tokens - 1, 0)])
+
+    space = cut.rfind(" ")
+    if space > len(cut) // 2:
+        cut = cut[:space]
+    return cut.rstrip() + " …"
+
+
+# ====== Budgeting ======
+def prompt_token_budget(language: str) -> int:
+    return PROMPT_TOKEN_BUDGETS.get(language, DEFAULT_PROMPT_TOKEN_BUDGET)
+
+
+def fit_chunks(chunks: List[str], budget: int, separator: str = CHUNK_SEPARATOR) -> List[str]:
+    """
+    Keep chunks (best first) within `budget` tokens, counting separators.
+    The first chunk is always kept, trimmed if necessary, so the model
+    never sees an empty context.
+    """
+    kept: List[str] = []
+    used = 0
+    sep_tokens = count_tokens(separator)
+
+    for chunk in chunks:
+        cost = count_tokens(chunk) + (sep_tokens if kept else 0)
+        if used + cost <= budget:
+            kept.append(chunk)
+            used += cost
+            continue
+
+        room = budget - used - (sep_tokens if kept else 0)
+        if not kept or room >= MIN_TRIMMED_CHUNK_TOKENS:
+            kept.append(trim_to_tokens(chunk, max(room, MIN_TRIMMED_CHUNK_TOKENS)))
+        break
+
+    return kept
+
+
+# ====== Usage accounting ======
+_USAGE = deque(maxlen=USAGE_LOG_SIZE)
+_USAGE_LOCK = threading.Lock()
+
+
+def record_usage(
+    response,
+    language: str,
+    estimated_prompt_tokens: int,
+    context_tokens: int,
+) -> Optional[Dict[str, int]]:
+    """
+    Log Gemini's token counts for one request (from response.usage_metadata,
+    next to our own estimate) and keep them for usage_stats().
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+
+    record = {
+        "language": language,
+        "prompt_tokens": int(getattr(usage, "prompt_token_count", 0) or 0),
+        "response_tokens": int(getattr(usage, "candidates_token_count", 0) or 0),
+        "total_tokens": int(getattr(usage, "total_token_count", 0) or 0),
+        "estimated_prompt_tokens": estimated_prompt_tokens,
+        "context_tokens": context_tokens,
+    }
+    print(
+        f"[prompt_budget] {language}: prompt={record['prompt_tokens']} "
+        f"(est. {estimated_prompt_tokens}, context {context_tokens}) "
+        f"response={record['response_tokens']}"
+    )
+    with _USAGE_LOCK:
+        _USAGE.append(record)
+    return record
+
+
+def usage_stats() -> Dict[str, float]:
+    """Averages over the last USAGE_LOG_SIZE Gemini requests in this process."""
+    with _USAGE_LOCK:
+        records = list(_USAGE)
+    if not records:
+        return {"requests": 0}
+
+    n = len(records)
+    return {
+        "requests": n,
+        "avg_prompt_tokens": sum(r["prompt_tokens"] for r in records) / n,
+        "avg_context_tokens": sum(r["context_tokens"] for r in records) / n,
+        "avg_response_tokens": sum(r["response_tokens"] for r in records) / n,
+        "max_prompt_tokens": max(r["prompt_tokens"] for r in records),
+    }
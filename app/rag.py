@@ -1,16 +1,62 @@
 import os
+import re
+import sys
 import json
+import argparse
+import time
+import shutil
+import hashlib
+import threading
 import faiss
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
 import vertexai
 
 from pathlib import Path
+from collections import Counter, OrderedDict
 from dotenv import load_dotenv
-from typing import List, Dict
+from typing import Callable, Iterator, List, Dict, NamedTuple, Optional, Sequence, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from google.api_core import exceptions as google_exceptions
 from google.oauth2 import service_account
 from vertexai.language_models import TextEmbeddingModel
 
+# --- make sure the project root is on sys.path (for `python app/rag.py`) ---
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.embedding_cache import get_embedding_cache, normalize_text
+from app.lexical import BM25Index, reciprocal_rank_fusion
+from app.singleflight import SingleFlight
+from app.embedders import Embedder, HashingEmbedder, SentenceTransformerEmbedder
+from app.faiss_index import (
+    INDEX_TYPES,
+    add_vectors,
+    benchmark_index_types,
+    build_layout,
+    compression_report,
+    describe_index_type,
+    effective_params,
+    index_build_params,
+    index_memory_bytes,
+    is_keyed_by_artifact_id,
+    knn_graph,
+    make_index,
+    needs_training,
+    QUANTIZATIONS,
+    read_index_mmap,
+    resolve_index_params,
+    sample_queries,
+    selector_search_params,
+    set_search_params,
+    stored_vectors,
+    supports_remove,
+)
+
 
 
 try:
@@ -30,11 +76,79 @@ DATA_DIR = BASE_DIR / "data"
 ARTIFACTS_CSV = DATA_DIR / "artifacts.csv"
 VECTOR_INDEX_PATH = DATA_DIR / "artifacts_index.faiss"
 METADATA_PARQUET_PATH = DATA_DIR / "artifacts_metadata.parquet"
+METADATA_ARROW_PATH = DATA_DIR / "artifacts_metadata.arrow"   # uncompressed, mmap-able
+INDEX_INFO_PATH = DATA_DIR / "artifacts_index.json"           # backend, dim, index type
+RELATED_ARTIFACTS_PATH = DATA_DIR / "artifacts_related.npy"   # kNN graph between artifacts
+
+# Builds are written to their own directory under index_versions/ and go live
+# when `index_current` (which holds the version name) is swapped to point at
+# them. The flat files above are only read if no versioned build exists yet.
+INDEX_VERSIONS_DIR = DATA_DIR / "index_versions"
+CURRENT_VERSION_PATH = DATA_DIR / "index_current"
+INDEX_KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))   # old builds kept for rollback
+# Workers only compare file sizes with the manifest when loading a build
+# (sha256 would read every GB of it before the first query); builds and
+# `activate` already do the full checksum check. Set to 1 to hash on load too.
+VECTORSTORE_VERIFY_CHECKSUMS = os.getenv("VECTORSTORE_VERIFY_CHECKSUMS", "0") == "1"
+
+# Multi-museum deployments: one shard per museum/collection under
+# data/museums/<museum>/ (its own artifacts.csv, index_versions/, index_current).
+# Shards are loaded on first query; beyond MAX_LOADED_SHARDS the least
+# recently used one is dropped from memory.
+MUSEUMS_DIR = DATA_DIR / "museums"
+MAX_LOADED_SHARDS = int(os.getenv("MAX_LOADED_SHARDS", "4"))
+SHARD_SEARCH_WORKERS = int(os.getenv("SHARD_SEARCH_WORKERS", "4"))
+
+# Memory-map the index + Arrow metadata instead of loading private copies,
+# so several Streamlit workers on one host share the page cache.
+VECTORSTORE_MMAP = os.getenv("VECTORSTORE_MMAP", "0") == "1"
+
+# Retrieval mode:
+#   dense  – FAISS only
+#   auto   – BM25 fast path when the question clearly names an artifact,
+#            FAISS for everything else (default)
+#   hybrid – BM25 + FAISS fused with Reciprocal Rank Fusion
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "auto")
+
+# Neighbours per artifact in the "related objects" graph computed at build
+# time (0 disables it – with a flat index the graph costs n^2 distances).
+RELATED_K = int(os.getenv("RELATED_ARTIFACTS_K", "8"))
+
+# Metadata columns retrieval can be filtered on, e.g.
+#   filters={"location": "Room 5", "material": ["bronze", "iron"]}
+FILTERABLE_COLUMNS = ("location", "period", "material")
 
 GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID")
 GCP_LOCATION = os.getenv("GCP_LOCATION", "us-central1")
 EMBEDDING_MODEL_NAME = "text-embedding-004"   # Vertex AI Text Embedding Model
 
+# Embedding backend: vertex | hashing | local (see embedders.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "vertex")
+HASHING_EMBEDDING_DIM = int(os.getenv("HASHING_EMBEDDING_DIM", "768"))
+LOCAL_EMBEDDING_MODEL_PATH = os.getenv("LOCAL_EMBEDDING_MODEL_PATH", "")
+
+# Optional smaller Vertex embeddings (text-embedding-004 supports truncating
+# its 768-dim output). Build and serve must use the same value.
+EMBEDDING_OUTPUT_DIM = int(os.getenv("EMBEDDING_OUTPUT_DIM", "0")) or None
+
+# Bulk embedding (index builds). text-embedding-004 accepts up to 250 texts
+# and ~20k input tokens per request. Batches stop at 100 texts or
+# EMBED_BATCH_MAX_CHARS characters (~4 chars per token, with headroom for
+# long multilingual descriptions), whichever comes first.
+EMBED_BATCH_SIZE = 100
+EMBED_BATCH_MAX_CHARS = int(os.getenv("EMBED_BATCH_MAX_CHARS", "40000"))
+EMBED_MAX_WORKERS = 4
+EMBED_MAX_RETRIES = 5
+EMBED_CHECKPOINT_DIR = DATA_DIR / "embedding_checkpoints"
+
+# ANN index type used by builds: flat | ivf_flat | hnsw | ivf_pq (see faiss_index.py)
+INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+
+# Streaming builds (catalogs too big for memory): rows read per chunk, and how
+# many vectors trained index types (IVF / PQ / SQ8 / PCA) learn from first.
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "5000"))
+STREAM_TRAIN_ROWS = int(os.getenv("STREAM_TRAIN_ROWS", "50000"))
+
 
 # ====== Vertex / Embeddings helpers ======
 def _get_gcp_config() -> tuple[str, str]:
@@ -84,8 +198,10 @@ def _load_sa_credentials():
 
 def init_vertex():
     """
-    Initialize Vertex AI for embeddings using explicit SA creds.
+    Initialize Vertex AI (embeddings + Gemini) using explicit SA creds.
     Works both locally and on Streamlit Cloud.
+
+    Returns the credentials so callers can tell when they expire.
     """
     project, location = _get_gcp_config()
     creds = _load_sa_credentials()
@@ -95,18 +211,271 @@ def init_vertex():
         location=location,
         credentials=creds,
     )
+    return creds
+
+
+# One embedding model handle per process: (model, credentials)
+_EMBEDDER = None
+_EMBEDDER_LOCK = threading.Lock()
+
+
+def _embedder_is_fresh(embedder) -> bool:
+    if embedder is None:
+        return False
+    _, creds = embedder
+    return not getattr(creds, "expired", False)
 
 
 def get_embedding_model() -> TextEmbeddingModel:
-    init_vertex()
-    return TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL_NAME)
+    """
+    Return the shared TextEmbeddingModel, creating it on first use.
+
+    Vertex init + credential loading + from_pretrained() only run again
+    when the service-account credentials report they have expired.
+    """
+    global _EMBEDDER
+
+    embedder = _EMBEDDER
+    if _embedder_is_fresh(embedder):
+        return embedder[0]
+
+    with _EMBEDDER_LOCK:
+        if not _embedder_is_fresh(_EMBEDDER):
+            creds = init_vertex()
+            model = TextEmbeddingModel.from_pretrained(EMBEDDING_MODEL_NAME)
+            _EMBEDDER = (model, creds)
+        return _EMBEDDER[0]
+
+
+def warm_up_embeddings():
+    """
+    Pay the embedding cold start (Vertex init, model handle, first
+    request) up front, e.g. when the Streamlit server boots.
+    """
+    embed_texts(["MuseAI warm-up"])
+
+
+class VertexEmbedder:
+    """Vertex AI text-embedding-004 through the shared model handle."""
+
+    def __init__(self, output_dim: Optional[int] = None):
+        self.dim = output_dim   # None = model default (768)
+        suffix = f"@{output_dim}" if output_dim else ""
+        self.name = f"vertex:{EMBEDDING_MODEL_NAME}{suffix}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        model = get_embedding_model()
+        embeddings = model.get_embeddings(texts, output_dimensionality=self.dim)
+        return np.array([e.values for e in embeddings], dtype="float32")
+
+
+_EMBEDDER_BACKENDS: Dict[str, Embedder] = {}
+_BACKENDS_LOCK = threading.Lock()
+
+
+def get_embedder(backend: str = EMBEDDING_BACKEND) -> Embedder:
+    """Process-wide Embedder for the configured backend."""
+    embedder = _EMBEDDER_BACKENDS.get(backend)
+    if embedder is not None:
+        return embedder
+
+    with _BACKENDS_LOCK:
+        if backend not in _EMBEDDER_BACKENDS:
+            if backend == "vertex":
+                _EMBEDDER_BACKENDS[backend] = VertexEmbedder(EMBEDDING_OUTPUT_DIM)
+            elif backend == "hashing":
+                _EMBEDDER_BACKENDS[backend] = HashingEmbedder(HASHING_EMBEDDING_DIM)
+            elif backend == "local":
+                if not LOCAL_EMBEDDING_MODEL_PATH:
+                    raise RuntimeError("EMBEDDING_BACKEND=local needs LOCAL_EMBEDDING_MODEL_PATH.")
+                _EMBEDDER_BACKENDS[backend] = SentenceTransformerEmbedder(LOCAL_EMBEDDING_MODEL_PATH)
+            else:
+                raise ValueError(
+                    f"Unknown EMBEDDING_BACKEND '{backend}'. Use vertex, hashing or local."
+                )
+        return _EMBEDDER_BACKENDS[backend]
+
+
+# Visitors asking the same question at the same moment share one request
+_EMBED_FLIGHTS = SingleFlight("embed")
 
 
 def embed_texts(texts: List[str]) -> np.ndarray:
-    """Return embeddings as a 2D float32 numpy array."""
-    model = get_embedding_model()
-    embeddings = model.get_embeddings(texts)
-    vectors = np.array([e.values for e in embeddings], dtype="float32")
+    """
+    Return embeddings as a 2D float32 numpy array.
+
+    Identical concurrent requests (same model, same texts up to case and
+    whitespace – like the embedding cache) share one backend call and the
+    returned array, so treat it as read-only.
+    """
+    embedder = get_embedder()
+    key = (embedder.name, tuple(normalize_text(t) for t in texts))
+    return _EMBED_FLIGHTS.do(key, embedder.embed, texts)
+
+
+def embedding_batches(
+    texts: List[str],
+    batch_size: int = EMBED_BATCH_SIZE,
+    max_chars: int = EMBED_BATCH_MAX_CHARS,
+) -> List[List[str]]:
+    """
+    Split texts into API-sized requests: at most batch_size texts and
+    max_chars characters each (a single longer text gets its own request).
+    """
+    batches: List[List[str]] = []
+    batch: List[str] = []
+    chars = 0
+    for t in texts:
+        if batch and (len(batch) == batch_size or chars + len(t) > max_chars):
+            batches.append(batch)
+            batch, chars = [], 0
+        batch.append(t)
+        chars += len(t)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def embed_queries(texts: List[str]) -> np.ndarray:
+    """
+    2-D embeddings for many query strings at once.
+
+    Cached queries come from the embedding cache; the misses are embedded in
+    as few API calls as possible (see embedding_batches).
+    """
+    cache = get_embedding_cache()
+    model_key = get_embedder().name
+    vectors: List[Optional[np.ndarray]] = [cache.get(model_key, t) for t in texts]
+
+    # Unique misses only, so repeated questions in one batch cost one embedding
+    missing = list(dict.fromkeys(t for t, v in zip(texts, vectors) if v is None))
+    fresh: Dict[str, np.ndarray] = {}
+    for chunk in embedding_batches(missing):
+        for text, vector in zip(chunk, embed_texts(chunk)):
+            cache.put(model_key, text, vector)
+            fresh[text] = vector
+
+    return np.vstack([
+        v if v is not None else fresh[t]
+        for t, v in zip(texts, vectors)
+    ]).astype("float32")
+
+
+def embed_query(text: str) -> np.ndarray:
+    """
+    1-D embedding for a single query string.
+
+    Served from the persistent embedding cache when possible, so repeated
+    visitor questions skip the embedding round-trip.
+    """
+    return embed_queries([text])[0]
+
+
+# ====== Bulk embedding (index builds) ======
+def _is_transient(error: Exception) -> bool:
+    """Worth retrying: rate limits (429), server errors (5xx), network drops."""
+    return isinstance(
+        error,
+        (google_exceptions.TooManyRequests, google_exceptions.ServerError, ConnectionError, TimeoutError),
+    )
+
+
+def _embed_batch_with_retry(texts: List[str], max_retries: int) -> np.ndarray:
+    """
+    embed_texts() with exponential backoff, for one API-sized chunk.
+    Only transient errors are retried; a bad request (400) fails at once.
+    """
+    for attempt in range(max_retries):
+        try:
+            return embed_texts(texts)
+        except Exception as e:
+            if attempt == max_retries - 1 or not _is_transient(e):
+                raise
+            wait_time = 2 ** attempt
+            print(
+                f"Embedding batch failed (attempt {attempt + 1}/{max_retries}): {e}. "
+                f"Retrying in {wait_time}s..."
+            )
+            time.sleep(wait_time)
+
+
+def _save_checkpoint(path: Path, vectors: np.ndarray):
+    # Write then rename, so a crash never leaves a half-written chunk behind
+    tmp_path = path.with_suffix(".tmp.npy")
+    np.save(tmp_path, vectors)
+    os.replace(tmp_path, path)
+
+
+def embed_texts_batched(
+    texts: List[str],
+    batch_size: int = EMBED_BATCH_SIZE,
+    max_chars: int = EMBED_BATCH_MAX_CHARS,
+    max_workers: int = EMBED_MAX_WORKERS,
+    max_retries: int = EMBED_MAX_RETRIES,
+    checkpoint_dir: Path = EMBED_CHECKPOINT_DIR,
+) -> np.ndarray:
+    """
+    Embed a large list of texts in API-sized chunks (see embedding_batches).
+
+    - Chunks run on a bounded thread pool, each with retry + backoff.
+    - Every finished chunk is saved under checkpoint_dir, keyed by a hash of
+      the model name + texts, so re-running an interrupted build only embeds
+      the chunks that are still missing.
+    - Prints throughput in artifacts/sec when done.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype="float32")
+
+    # Chunk numbering depends on the batch limits, so they are part of the key
+    run_hash = hashlib.sha256(f"{get_embedder().name}\0{batch_size}\0{max_chars}".encode("utf-8"))
+    for t in texts:
+        run_hash.update(t.encode("utf-8"))
+        run_hash.update(b"\0")
+    run_dir = checkpoint_dir / run_hash.hexdigest()[:16]
+    run_dir.mkdir(parents=True, exist_ok=True)
+
+    chunks = embedding_batches(texts, batch_size, max_chars)
+    results: Dict[int, np.ndarray] = {}
+
+    # Resume: pick up chunks finished by a previous run
+    for i, chunk in enumerate(chunks):
+        path = run_dir / f"chunk_{i:06d}.npy"
+        if path.exists():
+            vectors = np.load(path)
+            if len(vectors) == len(chunk):
+                results[i] = vectors
+
+    pending = [i for i in range(len(chunks)) if i not in results]
+    if results:
+        print(f"Resuming: {len(results)}/{len(chunks)} chunks already embedded.")
+
+    start_time = time.perf_counter()
+    embedded = 0
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(_embed_batch_with_retry, chunks[i], max_retries): i
+            for i in pending
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            vectors = future.result()
+            _save_checkpoint(run_dir / f"chunk_{i:06d}.npy", vectors)
+            results[i] = vectors
+            embedded += len(chunks[i])
+            print(f"  chunk {len(results)}/{len(chunks)} done")
+
+    elapsed = time.perf_counter() - start_time
+    if embedded:
+        print(
+            f"Embedded {embedded} artifacts in {elapsed:.1f}s "
+            f"({embedded / max(elapsed, 1e-9):.1f} artifacts/sec)"
+        )
+
+    vectors = np.vstack([results[i] for i in range(len(chunks))]).astype("float32")
+
+    # Build finished – checkpoints for this run are no longer needed
+    shutil.rmtree(run_dir, ignore_errors=True)
     return vectors
 
 
@@ -120,107 +489,1286 @@ def load_artifact_metadata(path: Path = ARTIFACTS_CSV) -> pd.DataFrame:
     return df
 
 
-def build_and_save_vectorstore():
-    """Create FAISS index from artifacts.csv and save index + metadata."""
-    df = load_artifact_metadata()
-
-    # Text embed = title + short label + base_context
-    texts = (
+def artifact_embedding_texts(df: pd.DataFrame) -> List[str]:
+    """Text embed = title + short label + base_context."""
+    return (
         df["title"].fillna("") + " - " +
         df["short_label"].fillna("") + " | " +
         df["base_context"].fillna("")
     ).tolist()
 
-    print(f"Embedding {len(texts)} artifacts…")
-    vectors = embed_texts(texts)
 
-    dim = vectors.shape[1]
-    index = faiss.IndexFlatL2(dim)
-    index.add(vectors)
+def content_hash(text: str) -> str:
+    """Stable hash of the embedded text, stored per artifact in the metadata."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def render_artifact_context(r) -> str:
+    """Context block for a known artifact (artifact_id from Vision)."""
+    return (
+        f"Artifact: {r['title']} (ID: {r['artifact_id']})\n"
+        f"Period: {r.get('period', 'Unknown')}\n"
+        f"Location: {r.get('location', 'Unknown')}\n"
+        f"Material: {r.get('material', 'Unknown')}\n"
+        f"Description: {r['base_context']}\n"
+    )
+
+
+def render_query_chunk(r) -> str:
+    """Context chunk for one artifact in a query-based RAG result."""
+    return (
+        f"Artifact: {r['title']} "
+        f"(ID: {r['artifact_id']}, Period: {r.get('period', 'Unknown')})\n"
+        f"Location: {r.get('location', 'Unknown')}\n"
+        f"Material: {r.get('material', 'Unknown')}\n"
+        f"Description: {r['base_context']}\n"
+    )
+
+
+def add_context_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """Pre-render both context formats once, so questions only do lookups."""
+    records = df.to_dict("records")
+    df["artifact_context"] = [render_artifact_context(r) for r in records]
+    df["query_context"] = [render_query_chunk(r) for r in records]
+    return df
+
+
+def prepare_catalog_rows(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str], np.ndarray]:
+    """
+    Embedding texts, content hashes and pre-rendered contexts for a slice of
+    the catalog. Returns (df, texts, artifact_ids).
+    """
+    texts = artifact_embedding_texts(df)
+    df["content_hash"] = [content_hash(t) for t in texts]
+    df = add_context_columns(df)
+    ids = df["artifact_id"].astype("int64").to_numpy()
+    return df, texts, ids
+
+
+def iter_catalog_chunks(path: Path = ARTIFACTS_CSV, chunk_rows: int = STREAM_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Read a CSV or Parquet catalog `chunk_rows` rows at a time, so only one
+    chunk is ever in memory.
+    """
+    if not path.exists():
+        raise FileNotFoundError(f"Metadata file not found: {path}")
+
+    if path.suffix == ".parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        with pd.read_csv(path, chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                yield chunk.reset_index(drop=True)
+
 
-    # Save FAISS index
-    faiss.write_index(index, str(VECTOR_INDEX_PATH))
-    print(f"Saved FAISS index to {VECTOR_INDEX_PATH}")
+# ====== Versioned index builds ======
+class StorePaths(NamedTuple):
+    version: Optional[str]     # None for the legacy flat files in data/
+    root: Path
+    index: Path
+    parquet: Path
+    arrow: Path
+    info: Path
+    related: Path
+    manifest: Optional[Path]
+
+
+# Every function here takes an optional data_dir: None is the default
+# single-museum store in data/, a museum shard passes data/museums/<museum>/
+# (same layout inside).
+def _versions_dir(data_dir: Optional[Path] = None) -> Path:
+    return INDEX_VERSIONS_DIR if data_dir is None else data_dir / INDEX_VERSIONS_DIR.name
+
+
+def _current_pointer(data_dir: Optional[Path] = None) -> Path:
+    return CURRENT_VERSION_PATH if data_dir is None else data_dir / CURRENT_VERSION_PATH.name
+
+
+def museum_dir(museum: str) -> Path:
+    """data/museums/<museum>/ – the shard directory for one museum."""
+    if not re.fullmatch(r"[\w.-]+", museum) or museum.startswith("."):
+        raise ValueError(f"Invalid museum name '{museum}' (letters, digits, '_', '-', '.').")
+    return MUSEUMS_DIR / museum
+
+
+def list_museums() -> List[str]:
+    """Museums that have a built shard."""
+    if not MUSEUMS_DIR.exists():
+        return []
+    return sorted(
+        d.name for d in MUSEUMS_DIR.iterdir()
+        if _current_pointer(d).exists() or (d / VECTOR_INDEX_PATH.name).exists()
+    )
+
+
+def legacy_store_paths(data_dir: Optional[Path] = None) -> StorePaths:
+    if data_dir is None:
+        return StorePaths(
+            version=None,
+            root=DATA_DIR,
+            index=VECTOR_INDEX_PATH,
+            parquet=METADATA_PARQUET_PATH,
+            arrow=METADATA_ARROW_PATH,
+            info=INDEX_INFO_PATH,
+            related=RELATED_ARTIFACTS_PATH,
+            manifest=None,
+        )
+    return StorePaths(
+        version=None,
+        root=data_dir,
+        index=data_dir / VECTOR_INDEX_PATH.name,
+        parquet=data_dir / METADATA_PARQUET_PATH.name,
+        arrow=data_dir / METADATA_ARROW_PATH.name,
+        info=data_dir / INDEX_INFO_PATH.name,
+        related=data_dir / RELATED_ARTIFACTS_PATH.name,
+        manifest=None,
+    )
+
+
+def version_store_paths(version: str, data_dir: Optional[Path] = None) -> StorePaths:
+    root = _versions_dir(data_dir) / version
+    return StorePaths(
+        version=version,
+        root=root,
+        index=root / VECTOR_INDEX_PATH.name,
+        parquet=root / METADATA_PARQUET_PATH.name,
+        arrow=root / METADATA_ARROW_PATH.name,
+        info=root / INDEX_INFO_PATH.name,
+        related=root / RELATED_ARTIFACTS_PATH.name,
+        manifest=root / "manifest.json",
+    )
+
+
+def current_version(data_dir: Optional[Path] = None) -> Optional[str]:
+    """Name of the live build, or None if only legacy files exist."""
+    try:
+        return _current_pointer(data_dir).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def current_store_paths(data_dir: Optional[Path] = None) -> StorePaths:
+    version = current_version(data_dir)
+    return version_store_paths(version, data_dir) if version else legacy_store_paths(data_dir)
+
+
+def list_versions(data_dir: Optional[Path] = None) -> List[str]:
+    """Finished builds (those with a manifest), oldest first."""
+    versions_dir = _versions_dir(data_dir)
+    if not versions_dir.exists():
+        return []
+    return sorted(
+        d.name for d in versions_dir.iterdir()
+        if (d / "manifest.json").exists()
+    )
 
-    # Save metadata (parquet keeps schema nicely)
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    df.to_parquet(METADATA_PARQUET_PATH, index=False)
-    print(f"Saved metadata to {METADATA_PARQUET_PATH}")
+
+def _new_version_paths(data_dir: Optional[Path] = None) -> StorePaths:
+    # UTC timestamp (to the microsecond) first, so names sort by build time
+    seconds, nanos = divmod(time.time_ns(), 10 ** 9)
+    version = time.strftime("%Y%m%d-%H%M%S", time.gmtime(seconds)) + f"-{nanos // 1000:06d}"
+    paths = version_store_paths(version, data_dir)
+    paths.root.mkdir(parents=True)
+    return paths
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def verify_version(paths: StorePaths, checksums: bool = True) -> Dict:
+    """
+    Check a build's files against its manifest (sizes always, sha256 if
+    `checksums`). Returns the manifest; raises RuntimeError on mismatch.
+    """
+    manifest = json.loads(paths.manifest.read_text())
+    for name, expected in manifest["files"].items():
+        path = paths.root / name
+        if not path.exists() or path.stat().st_size != expected["bytes"]:
+            raise RuntimeError(f"Index version {paths.version}: {name} is missing or truncated.")
+        if checksums and _file_sha256(path) != expected["sha256"]:
+            raise RuntimeError(f"Index version {paths.version}: checksum mismatch for {name}.")
+    return manifest
+
+
+def activate_version(version: str, verify: bool = True, data_dir: Optional[Path] = None):
+    """
+    Point `index_current` at a finished build (also used for rollbacks).
+    Running processes pick it up on their next query.
+    """
+    paths = version_store_paths(version, data_dir)
+    if not paths.manifest.exists():
+        raise ValueError(f"No finished index build named '{version}' in {_versions_dir(data_dir)}")
+    if verify:
+        verify_version(paths)
+    _write_atomic(_current_pointer(data_dir), lambda tmp: tmp.write_text(version))
+    print(f"Index version {version} is now live.")
+
+
+def _prune_versions(keep: int = INDEX_KEEP_VERSIONS, data_dir: Optional[Path] = None):
+    """Delete all but the newest `keep` builds (never the live one)."""
+    live = current_version(data_dir)
+    for version in list_versions(data_dir)[:-keep or None]:
+        if version != live:
+            # Processes still serving it keep their mmaps/open files (POSIX)
+            shutil.rmtree(_versions_dir(data_dir) / version, ignore_errors=True)
+
+
+def load_index_info(paths: Optional[StorePaths] = None) -> Dict:
+    """
+    Build info saved next to the index. Builds from before this file existed
+    were always made with Vertex text-embedding-004.
+    """
+    info_path = (paths or current_store_paths()).info
+    if info_path.exists():
+        return json.loads(info_path.read_text())
+    return {"embedding_backend": f"vertex:{EMBEDDING_MODEL_NAME}"}
+
+
+def check_index_embedder(info: Dict):
+    """Refuse to query an index with vectors from a different embedder."""
+    built_with = info.get("embedding_backend")
+    current = get_embedder().name
+    if built_with and built_with != current:
+        raise RuntimeError(
+            f"The vector index was built with '{built_with}' but the active embedding "
+            f"backend is '{current}'. Rebuild with `python app/rag.py build` "
+            "or switch EMBEDDING_BACKEND back."
+        )
+
+
+def _load_existing_for_update(data_dir: Optional[Path] = None):
+    """
+    Return (index, df) from the last build if it can be updated in place,
+    otherwise None (no build yet, or a legacy positional IndexFlatL2).
+    """
+    paths = current_store_paths(data_dir)
+    if not (paths.index.exists() and paths.parquet.exists()):
+        return None
+
+    if load_index_info(paths).get("embedding_backend") != get_embedder().name:
+        print("Embedding backend changed, doing a full rebuild.")
+        return None
+
+    # A private copy: the live build stays untouched until the new one is published
+    index = faiss.read_index(str(paths.index))
+    old_df = pd.read_parquet(paths.parquet)
+    if not is_keyed_by_artifact_id(index) or "content_hash" not in old_df.columns:
+        return None
+    return index, old_df
+
+
+def _write_atomic(path: Path, write):
+    """
+    Write to a temp file and rename over `path`, so readers never see a
+    half-written file.
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def build_and_save_vectorstore(
+    full_rebuild: bool = False,
+    index_type: str = INDEX_TYPE,
+    index_params: Optional[Dict] = None,
+    museum: Optional[str] = None,
+):
+    """
+    Create/update the FAISS index from artifacts.csv and save index + metadata.
+
+    The index (type chosen by index_type, see faiss_index.py) is keyed by
+    artifact_id, and the metadata keeps a content_hash per artifact. On
+    rebuild only added or edited rows are re-embedded and deleted rows are
+    removed, unless full_rebuild=True or the index type or its build-time
+    params (see faiss_index.BUILD_PARAMS) changed.
+
+    With `museum`, builds that museum's shard from
+    data/museums/<museum>/artifacts.csv instead of the default store.
+    """
+    data_dir = museum_dir(museum) if museum else None
+    df = load_artifact_metadata(data_dir / ARTIFACTS_CSV.name) if data_dir else load_artifact_metadata()
+
+    duplicated = df["artifact_id"][df["artifact_id"].duplicated()].tolist()
+    if duplicated:
+        raise ValueError(f"Duplicate artifact_id values in artifacts.csv: {duplicated}")
+
+    df, texts, ids = prepare_catalog_rows(df)
+
+    params = resolve_index_params(index_params)
+    # What make_index() would build for the catalog's current size
+    layout = build_layout(index_type, effective_params(index_type, params, len(texts)))
+
+    existing = None if full_rebuild else _load_existing_for_update(data_dir)
+    if existing is not None:
+        # The existing index keeps the tuning it was built with, so any
+        # build-time change (nlist, hnsw_m, pq_m, ...) needs a full rebuild,
+        # including an nlist/pq_nbits that was shrunk for a smaller catalog
+        info = load_index_info(current_store_paths(data_dir))
+        built_layout = build_layout(
+            describe_index_type(existing[0]),
+            index_build_params(existing[0], info.get("index_params")),
+        )
+        if built_layout != layout:
+            print(f"Index layout changed from {built_layout} to {layout}, doing a full rebuild.")
+            existing = None
+
+    if existing is not None:
+        index, old_df = existing
+        old_hashes = dict(zip(old_df["artifact_id"].astype("int64"), old_df["content_hash"]))
+        new_hashes = dict(zip(ids, df["content_hash"]))
+
+        removed = [aid for aid in old_hashes if aid not in new_hashes]
+        changed = [
+            aid for aid, h in new_hashes.items()
+            if aid in old_hashes and old_hashes[aid] != h
+        ]
+        added = [aid for aid in new_hashes if aid not in old_hashes]
+        print(
+            f"Incremental update: {len(added)} added, "
+            f"{len(changed)} changed, {len(removed)} removed."
+        )
+
+        stale = removed + changed
+        if stale and not supports_remove(index):
+            print(f"'{index_type}' indexes can't drop vectors, doing a full rebuild.")
+            existing = None
+        else:
+            set_search_params(index, nprobe=params["nprobe"], ef_search=params["ef_search"])
+            if stale:
+                index.remove_ids(np.array(stale, dtype="int64"))
+
+            to_embed = df["artifact_id"].isin(added + changed).to_numpy()
+            if to_embed.any():
+                vectors = embed_texts_batched([t for t, m in zip(texts, to_embed) if m])
+                add_vectors(index, vectors, ids[to_embed])
+
+    if existing is None:
+        print(f"Embedding {len(texts)} artifacts…")
+        vectors = embed_texts_batched(texts)
+
+        index = make_index(index_type, vectors, params)
+        add_vectors(index, vectors, ids)
+
+        report = compression_report(index, vectors, ids)
+        recall_key = next(key for key in report if key.startswith("recall@"))
+        print(
+            f"Index memory: {report['index_mb']:.2f} MB vs {report['raw_float32_mb']:.2f} MB "
+            f"as float32 ({report['memory_saved']:.1%} saved), "
+            f"{recall_key} vs exact search: {report[recall_key]:.3f}"
+        )
+
+    paths = _new_version_paths(data_dir)
+    try:
+        # Save metadata (parquet keeps schema nicely) + an uncompressed Arrow
+        # copy that workers can memory-map
+        df.to_parquet(paths.parquet, index=False)
+        feather.write_feather(df, paths.arrow, compression="uncompressed")
+        print(f"Saved metadata to {paths.parquet} and {paths.arrow}")
+    except BaseException:
+        shutil.rmtree(paths.root, ignore_errors=True)
+        raise
+
+    _publish_build(paths, index, params, ids, museum)
+
+
+def _publish_build(
+    paths: StorePaths,
+    index: faiss.Index,
+    params: Dict,
+    ids: np.ndarray,
+    museum: Optional[str] = None,
+):
+    """
+    Write the FAISS index, related-artifacts graph, build info and manifest
+    into the (metadata-only so far) version dir, then make it the live version.
+    """
+    try:
+        faiss.write_index(index, str(paths.index))
+        print(f"Saved FAISS index to {paths.index} ({index.ntotal} vectors)")
+
+        # Rows sorted by artifact_id: [artifact_id, neighbour_1, ..., neighbour_k]
+        ids = np.sort(np.asarray(ids, dtype="int64"))
+        graph = np.column_stack([ids, knn_graph(index, ids, k=RELATED_K)])
+        np.save(paths.related, graph)
+        print(f"Saved related-artifacts graph to {paths.related} (k={RELATED_K})")
+
+        info = {
+            "embedding_backend": get_embedder().name,
+            "dim": int(index.d),
+            "index_type": describe_index_type(index),
+            "index_params": index_build_params(index, params),   # as built, not as requested
+            "count": int(index.ntotal),
+        }
+        paths.info.write_text(json.dumps(info, indent=2))
+        print(f"Saved index info to {paths.info}: {info}")
+
+        manifest = {
+            "version": paths.version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "row_count": int(index.ntotal),
+            "embedding_backend": info["embedding_backend"],
+            "dim": info["dim"],
+            "index_type": info["index_type"],
+            "files": {
+                path.name: {"bytes": path.stat().st_size, "sha256": _file_sha256(path)}
+                for path in (paths.index, paths.parquet, paths.arrow, paths.info, paths.related)
+            },
+        }
+        # Written last: a directory without a manifest is an unfinished build
+        paths.manifest.write_text(json.dumps(manifest, indent=2))
+    except BaseException:
+        shutil.rmtree(paths.root, ignore_errors=True)
+        raise
+
+    data_dir = museum_dir(museum) if museum else None
+    activate_version(paths.version, verify=False, data_dir=data_dir)   # checksums were just computed
+    _prune_versions(data_dir=data_dir)
+
+    # Make sure this process serves the fresh build on the next query
+    if museum:
+        _SHARDS.invalidate(museum)
+    else:
+        _VECTORSTORE.invalidate()
+
+
+class _MetadataStreamWriter:
+    """
+    Appends metadata chunks to the parquet + Arrow files of a new build.
+    Nothing reads them before the build is published, so they are written
+    in place.
+
+    The Arrow schema is fixed by the first chunk; later chunks are cast to it
+    (a column that is empty in one chunk and filled in another would
+    otherwise change type half-way through the file).
+    """
+
+    def __init__(self, paths: StorePaths):
+        self.paths = paths
+        self.schema = None
+        self._parquet = None
+        self._arrow = None
+
+    def write(self, df: pd.DataFrame):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.schema is None:
+            # All-empty columns come through as null type; store them as text
+            self.schema = pa.schema([
+                f.with_type(pa.string()) if pa.types.is_null(f.type) else f
+                for f in table.schema
+            ], metadata=table.schema.metadata)
+            self._parquet = pq.ParquetWriter(str(self.paths.parquet), self.schema)
+            self._arrow = pa.ipc.new_file(str(self.paths.arrow), self.schema)
+
+        table = table.select(self.schema.names).cast(self.schema)
+        self._parquet.write_table(table)
+        self._arrow.write_table(table)
+
+    def close(self):
+        for writer in (self._parquet, self._arrow):
+            if writer is not None:
+                writer.close()
+
+
+def stream_build_vectorstore(
+    catalog_path: Optional[Path] = None,
+    chunk_rows: int = STREAM_CHUNK_ROWS,
+    index_type: str = INDEX_TYPE,
+    index_params: Optional[Dict] = None,
+    train_rows: int = STREAM_TRAIN_ROWS,
+    museum: Optional[str] = None,
+):
+    """
+    Full build for catalogs too big to load at once (CSV or Parquet).
+
+    The catalog is read `chunk_rows` at a time; each chunk is embedded,
+    added to the index and appended to the metadata files before the next
+    one is read. Trained index types first buffer up to `train_rows`
+    vectors to learn from, then stream like the rest.
+
+    Ingestion memory stays flat however big the catalog is – what grows is
+    the index itself (use quantization / pca_dim to keep it small).
+    With `museum`, the build goes to that museum's shard. The catalog
+    defaults to artifacts.csv of the store being built.
+    """
+    data_dir = museum_dir(museum) if museum else None
+    if catalog_path is None:
+        catalog_path = data_dir / ARTIFACTS_CSV.name if data_dir else ARTIFACTS_CSV
+    params = resolve_index_params(index_params)
+    train_rows = train_rows if needs_training(index_type, params) else 0
+
+    index = None
+    pending: List[Tuple[np.ndarray, np.ndarray]] = []   # vectors waiting for training
+    seen_ids = set()
+    paths = _new_version_paths(data_dir)
+    writer = _MetadataStreamWriter(paths)
+    rows = 0
+    start_time = time.perf_counter()
+
+    try:
+        for df in iter_catalog_chunks(catalog_path, chunk_rows):
+            chunk_ids = df["artifact_id"].astype("int64")
+            duplicated = sorted(set(chunk_ids[chunk_ids.duplicated()]) | (seen_ids & set(chunk_ids)))
+            if duplicated:
+                raise ValueError(f"Duplicate artifact_id values in {catalog_path.name}: {duplicated}")
+            seen_ids.update(chunk_ids)
+
+            df, texts, ids = prepare_catalog_rows(df)
+            vectors = embed_texts_batched(texts)
+            writer.write(df)
+            rows += len(df)
+
+            if index is None:
+                pending.append((vectors, ids))
+                if sum(len(v) for v, _ in pending) < train_rows:
+                    continue
+                index = make_index(index_type, np.vstack([v for v, _ in pending]), params)
+                for pending_vectors, pending_ids in pending:
+                    add_vectors(index, pending_vectors, pending_ids)
+                pending = []
+            else:
+                add_vectors(index, vectors, ids)
+
+            print(f"Streamed {rows} artifacts ({time.perf_counter() - start_time:.0f}s)")
+
+        if index is None:
+            if not pending:
+                raise ValueError(f"No artifacts found in {catalog_path}")
+            # Whole catalog fit in the training sample
+            index = make_index(index_type, np.vstack([v for v, _ in pending]), params)
+            for pending_vectors, pending_ids in pending:
+                add_vectors(index, pending_vectors, pending_ids)
+    except BaseException:
+        writer.close()
+        shutil.rmtree(paths.root, ignore_errors=True)
+        raise
+
+    writer.close()
+    print(f"Saved metadata to {paths.parquet} and {paths.arrow}")
+    print(
+        f"Index memory: {index_memory_bytes(index) / 1e6:.2f} MB "
+        f"for {index.ntotal} vectors"
+    )
+
+    _publish_build(paths, index, params, np.fromiter(seen_ids, dtype="int64"), museum)
 
 
 # ====== Index loading & retrieval ======
-def load_vectorstore():
-    if not VECTOR_INDEX_PATH.exists():
+def load_vectorstore(mmap: bool = VECTORSTORE_MMAP, paths: Optional[StorePaths] = None):
+    """
+    Read the FAISS index + metadata of the live build (or of `paths`).
+
+    With mmap=True the index is memory-mapped read-only and the metadata is
+    opened as a memory-mapped Arrow file (Arrow-backed DataFrame columns),
+    so worker processes share one page-cache copy.
+    """
+    paths = paths or current_store_paths()
+    if not paths.index.exists():
         raise FileNotFoundError(
-            f"Vector index not found at {VECTOR_INDEX_PATH}. "
+            f"Vector index not found at {paths.index}. "
             "Run build_and_save_vectorstore() first."
         )
-    if not METADATA_PARQUET_PATH.exists():
+    if not paths.parquet.exists():
         raise FileNotFoundError(
-            f"Metadata parquet not found at {METADATA_PARQUET_PATH}. "
+            f"Metadata parquet not found at {paths.parquet}. "
             "Run build_and_save_vectorstore() first."
         )
 
-    index = faiss.read_index(str(VECTOR_INDEX_PATH))
-    df = pd.read_parquet(METADATA_PARQUET_PATH)
+    if mmap and paths.arrow.exists():
+        index = read_index_mmap(str(paths.index))
+        table = feather.read_table(paths.arrow, memory_map=True)
+        df = table.to_pandas(types_mapper=pd.ArrowDtype)
+    else:
+        if mmap:
+            print(f"{paths.arrow} not found, loading metadata from parquet.")
+        index = faiss.read_index(str(paths.index))
+        df = pd.read_parquet(paths.parquet)
+
+    # Row labels follow the FAISS ids: artifact_id for ID-mapped indexes,
+    # plain row position for legacy IndexFlatL2 builds.
+    if is_keyed_by_artifact_id(index):
+        df.index = df["artifact_id"].astype("int64").to_numpy()
+
+    # Older builds don't carry pre-rendered context blocks yet
+    if "artifact_context" not in df.columns or "query_context" not in df.columns:
+        df = add_context_columns(df)
     return index, df
 
 
-def retrieve_artifacts(query: str, k: int = 3) -> List[Dict]:
-    """Return top-k artifacts as list of dicts with a distance score."""
-    index, df = load_vectorstore()
-    query_vec = embed_texts([query])
-    distances, indices = index.search(query_vec, k)
+class StoreSnapshot(NamedTuple):
+    index: faiss.Index
+    df: pd.DataFrame
+    contexts: Dict[int, str]    # artifact_id -> pre-rendered context block
+    labels: Dict[int, int]      # artifact_id -> df row label
+    facets: Dict[tuple, frozenset]   # (column, value) -> matching artifact_ids, filled lazily
+    version: Optional[str]      # build version (None for legacy flat files)
+    related: Optional[np.ndarray]   # [artifact_id, neighbours...] rows sorted by id; None if not built
 
+
+class VectorStore:
+    """
+    Process-resident FAISS index + metadata.
+
+    Streamlit imports this module once per server process, so a single
+    instance is shared by every visitor session.
+
+    Every query checks which build is live (`index_current`, or the legacy
+    files' mtime/size). When it changes, the new build is loaded on a
+    background thread while queries keep being answered from the old
+    snapshot, then the snapshot is swapped in one assignment. Queries that
+    already hold the old snapshot finish on it.
+
+    Alongside (index, df) it keeps an artifact_id -> context dict, so known
+    artifacts (the common case after Vision) are a single dict lookup, and
+    a BM25 index built lazily on first lexical query.
+
+    `data_dir` selects a museum shard (see ShardRouter); None is the default
+    store in data/.
+    """
+
+    def __init__(self, data_dir: Optional[Path] = None):
+        self.data_dir = data_dir
+        self._lock = threading.Lock()
+        self._signature = None
+        self._loaded: Optional[StoreSnapshot] = None   # swapped as one object
+        self._lexical = None                           # (snapshot, BM25Index)
+        self._reloading = False
+        self._failed_signature = None                  # don't retry a broken build every query
+
+    def _store_signature(self) -> tuple:
+        version = current_version(self.data_dir)
+        if version:
+            return ("version", version)
+
+        sig = ["legacy"]
+        legacy = legacy_store_paths(self.data_dir)
+        for path in (legacy.index, legacy.parquet, legacy.arrow, legacy.info):
+            stat = path.stat() if path.exists() else None
+            sig.append((stat.st_mtime_ns, stat.st_size) if stat else None)
+        return tuple(sig)
+
+    def _load(self, signature: tuple) -> StoreSnapshot:
+        if signature[0] == "version":
+            paths = version_store_paths(signature[1], self.data_dir)
+            manifest = verify_version(paths, checksums=VECTORSTORE_VERIFY_CHECKSUMS)
+        else:
+            paths, manifest = legacy_store_paths(self.data_dir), None
+
+        check_index_embedder(load_index_info(paths))
+        index, df = load_vectorstore(paths=paths)
+        if manifest is not None and not (manifest["row_count"] == index.ntotal == len(df)):
+            raise RuntimeError(
+                f"Index version {paths.version}: manifest says {manifest['row_count']} rows, "
+                f"found {index.ntotal} vectors and {len(df)} metadata rows."
+            )
+
+        related = None
+        if paths.related.exists():
+            related = np.load(paths.related, mmap_mode="r" if VECTORSTORE_MMAP else None)
+
+        ids = df["artifact_id"].tolist()
+        return StoreSnapshot(
+            index=index,
+            df=df,
+            contexts=dict(zip(ids, df["artifact_context"])),
+            labels=dict(zip(ids, df.index.tolist())),
+            facets={},
+            version=paths.version,
+            related=related,
+        )
+
+    def snapshot(self) -> StoreSnapshot:
+        """Current StoreSnapshot; a newer build is loaded in the background."""
+        signature = self._store_signature()
+        loaded = self._loaded
+        if loaded is not None:
+            if signature != self._signature:
+                self._start_reload(signature)
+            return loaded
+
+        with self._lock:
+            # First load (or after invalidate()) – nothing to serve meanwhile
+            if self._loaded is None:
+                self._loaded = self._load(signature)
+                self._signature = signature
+            return self._loaded
+
+    def _start_reload(self, signature: tuple):
+        with self._lock:
+            if self._reloading or signature in (self._signature, self._failed_signature):
+                return
+            self._reloading = True
+        threading.Thread(
+            target=self._reload, args=(signature,), name="vectorstore-reload", daemon=True
+        ).start()
+
+    def _reload(self, signature: tuple):
+        try:
+            snap = self._load(signature)
+        except Exception as e:
+            print(f"[VectorStore] Could not load {signature}, still serving the previous build: {e}")
+            with self._lock:
+                self._failed_signature = signature
+                self._reloading = False
+            return
+
+        with self._lock:
+            self._loaded = snap
+            self._signature = signature
+            self._reloading = False
+        print(f"[VectorStore] Now serving index version {snap.version or 'legacy'}.")
+
+    def get(self):
+        """Return (index, df) of the current snapshot."""
+        snap = self.snapshot()
+        return snap.index, snap.df
+
+    def artifact_contexts(self) -> Dict[int, str]:
+        """Pre-rendered context block per artifact_id."""
+        return self.snapshot().contexts
+
+    def lexical(self, snap: Optional[StoreSnapshot] = None) -> BM25Index:
+        """BM25 index over `snap` (default: current) metadata, built on first use."""
+        snap = snap or self.snapshot()
+        lexical = self._lexical
+        if lexical is not None and lexical[0] is snap:
+            return lexical[1]
+
+        with self._lock:
+            if self._lexical is None or self._lexical[0] is not snap:
+                cols = ["artifact_id", "title", "short_label", "base_context"]
+                self._lexical = (snap, BM25Index(snap.df[cols].to_dict("records")))
+            return self._lexical[1]
+
+    def invalidate(self):
+        """Drop the in-memory copy so the next get() reloads from disk."""
+        with self._lock:
+            self._signature = None
+            self._loaded = None
+            self._lexical = None
+            self._failed_signature = None
+
+
+_VECTORSTORE = VectorStore()
+
+
+def get_vectorstore():
+    """Shared (index, df) for this process."""
+    return _VECTORSTORE.get()
+
+
+def _hits_to_rows(df: pd.DataFrame, distances: np.ndarray, labels: np.ndarray) -> List[Dict]:
     results = []
-    for dist, idx in zip(distances[0], indices[0]):
-        row = df.iloc[int(idx)].to_dict()
+    for dist, idx in zip(distances, labels):
+        if idx < 0:   # fewer than k vectors in the index
+            continue
+        row = df.loc[int(idx)].to_dict()
         row["score"] = float(dist)
+        row["retrieval"] = "dense"
         results.append(row)
+    return results
 
+
+def _artifact_rows(snap: StoreSnapshot, hits, retrieval: str) -> List[Dict]:
+    """Rows for (artifact_id, score) pairs from BM25 or fusion."""
+    results = []
+    for aid, score in hits:
+        label = snap.labels.get(aid)
+        if label is None:
+            continue
+        row = snap.df.loc[label].to_dict()
+        row["score"] = float(score)
+        row["retrieval"] = retrieval
+        results.append(row)
     return results
 
 
-def build_context_for_query(query: str, k: int = 3) -> str:
+FilterValue = Union[str, List[str]]
+
+
+def _facet_ids(snap: StoreSnapshot, column: str, value: str) -> frozenset:
+    """artifact_ids whose `column` contains `value` as a whole word/phrase."""
+    key = (column, value.casefold())
+    ids = snap.facets.get(key)
+    if ids is None:
+        pattern = rf"(?<!\w){re.escape(value)}(?!\w)"
+        mask = snap.df[column].astype(str).str.contains(pattern, case=False, regex=True)
+        ids = frozenset(snap.df.loc[mask.fillna(False).to_numpy(bool), "artifact_id"].tolist())
+        snap.facets[key] = ids
+    return ids
+
+
+def _allowed_artifact_ids(
+    snap: StoreSnapshot,
+    filters: Optional[Dict[str, FilterValue]],
+) -> Optional[frozenset]:
+    """
+    Resolve filters to a set of artifact_ids (None = no filtering).
+    Values within one column are OR-ed, columns are AND-ed.
+    """
+    if not filters:
+        return None
+
+    allowed = None
+    for column, values in filters.items():
+        if column not in FILTERABLE_COLUMNS:
+            raise ValueError(f"Cannot filter on '{column}'. Use one of {FILTERABLE_COLUMNS}.")
+        if isinstance(values, str):
+            values = [values]
+        matched = frozenset().union(*(_facet_ids(snap, column, v) for v in values))
+        allowed = matched if allowed is None else allowed & matched
+    return allowed
+
+
+def retrieve_artifacts(
+    query: str,
+    k: int = 3,
+    mode: str = RETRIEVAL_MODE,
+    filters: Optional[Dict[str, FilterValue]] = None,
+    museums: Optional[Sequence[str]] = None,
+) -> List[Dict]:
+    """
+    Return top-k artifacts as list of dicts with a score.
+
+    `score` is the L2 distance for dense hits, the BM25 score for lexical
+    hits and the RRF score for hybrid results (see `retrieval` on each row).
+    `filters` restricts the search to matching location/period/material.
+    `museums` searches those museum shards instead of the default store
+    (pass list_museums() for all of them); rows then carry a `museum` key.
+    """
+    return retrieve_artifacts_batch([query], k=k, mode=mode, filters=filters, museums=museums)[0]
+
+
+def retrieve_artifacts_batch(
+    queries: List[str],
+    k: int = 3,
+    mode: str = RETRIEVAL_MODE,
+    filters: Optional[Dict[str, FilterValue]] = None,
+    museums: Optional[Sequence[str]] = None,
+) -> List[List[Dict]]:
+    """
+    Batch version of retrieve_artifacts() for evals and bulk tooling.
+
+    Queries answered by the lexical fast path skip embedding entirely; the
+    rest are embedded together (cache first, then batched API calls) and
+    searched with a single matrix index.search(). Filters are applied inside
+    the FAISS scan through an ID selector. Returns one result list per
+    query, in the same order as `queries`.
+    """
+    if mode not in ("dense", "auto", "hybrid"):
+        raise ValueError(f"Unknown retrieval mode '{mode}'. Use dense, auto or hybrid.")
+    if not queries:
+        return []
+    if museums is not None:
+        return _SHARDS.search(queries, k=k, mode=mode, filters=filters, museums=museums)
+
+    return _search_store(
+        _VECTORSTORE, queries, k, mode, filters,
+        embed=lambda idx: embed_queries([queries[i] for i in idx]),
+    )
+
+
+def _search_store(
+    store: "VectorStore",
+    queries: List[str],
+    k: int,
+    mode: str,
+    filters: Optional[Dict[str, FilterValue]],
+    embed: Callable[[List[int]], np.ndarray],
+) -> List[List[Dict]]:
+    """
+    retrieve_artifacts_batch() against one store. `embed(indices)` returns
+    the query vectors for those positions in `queries`, so shards searched
+    in parallel can share one embedding call.
+    """
+    snap = store.snapshot()
+    allowed = _allowed_artifact_ids(snap, filters)
+    if allowed is not None and not allowed:
+        return [[] for _ in queries]
+
+    results: List[Optional[List[Dict]]] = [None] * len(queries)
+    lexical_hits: Dict[int, List] = {}
+
+    if mode != "dense":
+        bm25 = store.lexical(snap)
+        for i, query in enumerate(queries):
+            if mode == "auto":
+                strong = bm25.strong_match(query, k=k, allowed=allowed)
+                if strong:
+                    results[i] = _artifact_rows(snap, strong, "lexical")
+            else:
+                lexical_hits[i] = bm25.search(query, k=k, allowed=allowed)
+
+    dense = [i for i, r in enumerate(results) if r is None]
+    if dense:
+        query_vecs = embed(dense)
+        if allowed is None:
+            distances, indices = snap.index.search(query_vecs, k)
+        else:
+            labels = [snap.labels[aid] for aid in allowed if aid in snap.labels]
+            params = selector_search_params(snap.index, np.array(labels), k=k)
+            distances, indices = snap.index.search(query_vecs, k, params=params)
+
+        for row_no, i in enumerate(dense):
+            dense_rows = _hits_to_rows(snap.df, distances[row_no], indices[row_no])
+            if mode != "hybrid":
+                results[i] = dense_rows
+                continue
+
+            fused = reciprocal_rank_fusion([
+                [aid for aid, _ in lexical_hits[i]],
+                [r["artifact_id"] for r in dense_rows],
+            ])
+            results[i] = _artifact_rows(snap, fused[:k], "hybrid")
+
+    return results
+
+
+def build_context_for_query(
+    query: str,
+    k: int = 3,
+    filters: Optional[Dict[str, FilterValue]] = None,
+    museums: Optional[Sequence[str]] = None,
+) -> str:
     """
     Return a text block you will pass into the LLM as RAG context.
     """
-    results = retrieve_artifacts(query, k=k)
+    return "\n---\n".join(context_chunks_for_query(query, k=k, filters=filters, museums=museums))
+
+
+def context_chunks_for_query(
+    query: str,
+    k: int = 3,
+    filters: Optional[Dict[str, FilterValue]] = None,
+    museums: Optional[Sequence[str]] = None,
+) -> List[str]:
+    """The per-artifact chunks behind build_context_for_query(), best first."""
+    results = retrieve_artifacts(query, k=k, filters=filters, museums=museums)
 
     if not results:
-        return "No matching artifacts found in the museum knowledge base."
-
-    chunks = []
-    for r in results:
-        chunk = (
-            f"Artifact: {r['title']} "
-            f"(ID: {r['artifact_id']}, Period: {r.get('period', 'Unknown')})\n"
-            f"Location: {r.get('location', 'Unknown')}\n"
-            f"Material: {r.get('material', 'Unknown')}\n"
-            f"Description: {r['base_context']}\n"
-        )
-        chunks.append(chunk)
+        return ["No matching artifacts found in the museum knowledge base."]
 
-    return "\n---\n".join(chunks)
+    return [r["query_context"] for r in results]
 
 
-def build_context_for_artifact_id(artifact_id: int) -> str:
+def build_context_for_artifact_id(artifact_id: int, museum: Optional[str] = None) -> str:
     """Return RAG context specifically for a known artifact."""
-    _, df = load_vectorstore()  # loads FAISS + metadata
-
-    row = df[df["artifact_id"] == artifact_id]
-    if row.empty:
+    store = _SHARDS.store(museum) if museum else _VECTORSTORE
+    context = store.artifact_contexts().get(artifact_id)
+    if context is None:
         return "No RAG context found for this artifact."
+    return context
 
-    r = row.iloc[0]
 
-    return (
-        f"Artifact: {r['title']} (ID: {r['artifact_id']})\n"
-        f"Period: {r.get('period', 'Unknown')}\n"
-        f"Location: {r.get('location', 'Unknown')}\n"
-        f"Material: {r.get('material', 'Unknown')}\n"
-        f"Description: {r['base_context']}\n"
+def get_artifact(artifact_id: int, museum: Optional[str] = None) -> Optional[Dict]:
+    """Metadata row (title, location, material, period, ...) for one artifact, or None."""
+    store = _SHARDS.store(museum) if museum else _VECTORSTORE
+    snap = store.snapshot()
+    label = snap.labels.get(artifact_id)
+    if label is None:
+        return None
+    return snap.df.loc[label].to_dict()
+
+
+def related_artifacts(artifact_id: int, k: int = 3, museum: Optional[str] = None) -> List[Dict]:
+    """
+    Up to k artifacts most similar to `artifact_id` ("what else is like
+    this?"), read from the neighbour graph computed at build time – no
+    embedding call and no index search. `score` is the neighbour rank
+    (1 = closest). Empty if the artifact or the graph is unknown.
+    """
+    store = _SHARDS.store(museum) if museum else _VECTORSTORE
+    snap = store.snapshot()
+    graph = snap.related
+    if graph is None or not len(graph):
+        return []
+
+    pos = int(np.searchsorted(graph[:, 0], artifact_id))
+    if pos == len(graph) or graph[pos, 0] != artifact_id:
+        return []
+
+    neighbours = [int(aid) for aid in graph[pos, 1:] if aid >= 0][:k]
+    return _artifact_rows(snap, [(aid, rank) for rank, aid in enumerate(neighbours, start=1)], "related")
+
+
+def build_related_context(artifact_id: int, k: int = 3, museum: Optional[str] = None) -> str:
+    """Short list of related objects to append to an artifact's context ("" if none)."""
+    rows = related_artifacts(artifact_id, k=k, museum=museum)
+    if not rows:
+        return ""
+    lines = [
+        f"- {r['title']} (ID: {r['artifact_id']}, Period: {r.get('period', 'Unknown')}, "
+        f"Location: {r.get('location', 'Unknown')})"
+        for r in rows
+    ]
+    return "Related objects in the collection:\n" + "\n".join(lines) + "\n"
+
+
+# ====== Multi-museum shards ======
+class _SharedQueryVectors:
+    """
+    Query embeddings shared by all shards of one search: the first shard
+    that needs a query embeds it, the others reuse the vector.
+    """
+
+    def __init__(self, queries: List[str]):
+        self.queries = queries
+        self._vectors: Dict[int, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, idx: List[int]) -> np.ndarray:
+        with self._lock:
+            missing = [i for i in idx if i not in self._vectors]
+            if missing:
+                vectors = embed_queries([self.queries[i] for i in missing])
+                self._vectors.update(zip(missing, vectors))
+            return np.vstack([self._vectors[i] for i in idx])
+
+
+def _merge_key(row: Dict, rank: int) -> tuple:
+    """
+    Cross-shard ordering for a row at position `rank` in its shard's list.
+
+    Dense distances are comparable across shards (same embedder), so dense
+    hits merge by ascending L2 distance. BM25 scores are not: every shard
+    has its own IDF and average length, so lexical and hybrid hits merge by
+    their rank within the shard (RRF over the shard lists: best of each
+    shard first, then the second best, ...). Hybrid RRF scores only depend
+    on ranks, so they break ties between shards. In auto mode a shard's
+    lexical (named-artifact) hits rank ahead of other shards' dense hits.
+    """
+    if row["retrieval"] == "dense":
+        return (2, row["score"])
+    if row["retrieval"] == "hybrid":
+        return (1, rank, -row["score"])
+    return (0, rank)
+
+
+class ShardRouter:
+    """
+    One VectorStore per museum shard (data/museums/<museum>/).
+
+    Shards are loaded on their first query and kept in LRU order; beyond
+    `max_loaded` the least recently used idle one is dropped, so a worker
+    only holds the collections it is actually serving. Shards taking part
+    in a running search are pinned and never dropped mid-search. A search
+    fans out over the requested shards on a thread pool (FAISS releases the
+    GIL while scanning) and merges the per-shard top-k.
+    """
+
+    def __init__(self, max_loaded: int = MAX_LOADED_SHARDS, max_workers: int = SHARD_SEARCH_WORKERS):
+        self.max_loaded = max_loaded
+        self._stores: "OrderedDict[str, VectorStore]" = OrderedDict()
+        self._pinned: Counter = Counter()   # museum -> searches currently using it
+        self._warned_fanout = False
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shard-search")
+
+    def store(self, museum: str) -> VectorStore:
+        """The museum's VectorStore, marking it most recently used."""
+        with self._lock:
+            store = self._stores.get(museum)
+            if store is None:
+                data_dir = museum_dir(museum)
+                if not data_dir.exists():
+                    raise ValueError(f"Unknown museum '{museum}': no shard at {data_dir}")
+                store = self._stores[museum] = VectorStore(data_dir)
+            self._stores.move_to_end(museum)
+            self._evict_locked()
+            return store
+
+    def _evict_locked(self):
+        # Pinned shards stay loaded even past max_loaded; queries still
+        # holding an evicted snapshot finish normally
+        idle = [m for m in self._stores if not self._pinned[m]]
+        for museum in idle[: max(0, len(self._stores) - self.max_loaded)]:
+            del self._stores[museum]
+            print(f"[ShardRouter] Unloaded idle shard '{museum}'.")
+
+    def loaded(self) -> List[str]:
+        """Museums currently in memory, least recently used first."""
+        with self._lock:
+            return list(self._stores)
+
+    def invalidate(self, museum: str):
+        with self._lock:
+            store = self._stores.get(museum)
+        if store is not None:
+            store.invalidate()
+
+    def search(
+        self,
+        queries: List[str],
+        k: int = 3,
+        mode: str = RETRIEVAL_MODE,
+        filters: Optional[Dict[str, FilterValue]] = None,
+        museums: Optional[Sequence[str]] = None,
+    ) -> List[List[Dict]]:
+        """Top-k per query across `museums` (default: every built shard)."""
+        museums = list(museums) if museums is not None else list_museums()
+        if not museums:
+            raise FileNotFoundError(
+                f"No museum shards found in {MUSEUMS_DIR}. "
+                "Build one with `python app/rag.py build --museum <name>`."
+            )
+
+        museums = list(dict.fromkeys(museums))
+        with self._lock:
+            if len(museums) > self.max_loaded and not self._warned_fanout:
+                print(
+                    f"[ShardRouter] Searching {len(museums)} shards with MAX_LOADED_SHARDS="
+                    f"{self.max_loaded}; idle shards will be reloaded on every search. "
+                    "Raise MAX_LOADED_SHARDS to keep them all in memory."
+                )
+                self._warned_fanout = True
+            self._pinned.update(museums)
+
+        try:
+            embed = _SharedQueryVectors(queries)
+            futures = {
+                museum: self._pool.submit(_search_store, self.store(museum), queries, k, mode, filters, embed)
+                for museum in museums
+            }
+
+            merged: List[List[tuple]] = [[] for _ in queries]
+            for museum, future in futures.items():
+                for i, rows in enumerate(future.result()):
+                    for rank, row in enumerate(rows):
+                        row["museum"] = museum
+                        merged[i].append((_merge_key(row, rank), row))
+        finally:
+            with self._lock:
+                self._pinned -= Counter(museums)
+                self._evict_locked()
+
+        # Stable sort: equal keys keep the order of `museums`
+        return [[row for _, row in sorted(rows, key=lambda item: item[0])[:k]] for rows in merged]
+
+
+_SHARDS = ShardRouter()
+
+
+
+# ====== Index benchmark ======
+def benchmark_vectorstore(
+    k: int = 10,
+    n_queries: int = 200,
+    queries_path: Optional[Path] = None,
+    index_params: Optional[Dict] = None,
+) -> pd.DataFrame:
+    """
+    Recall@k vs exact search and p50/p99 latency for every index type,
+    measured on the current catalog vectors.
+
+    Queries come from a CSV with a `query` column if given, otherwise they
+    are catalog vectors with a little Gaussian noise added.
+    """
+    index, _ = load_vectorstore()
+    try:
+        vectors = stored_vectors(index)
+    except ValueError:
+        # Compressed/ANN build on disk: re-embed the catalog for exact vectors
+        vectors = embed_texts_batched(artifact_embedding_texts(load_artifact_metadata()))
+
+    if queries_path is not None:
+        queries = np.vstack([embed_query(q) for q in load_artifact_metadata(queries_path)["query"]])
+    else:
+        queries = sample_queries(vectors, n_queries)
+
+    report = benchmark_index_types(vectors, queries, k=k, params=index_params)
+    return pd.DataFrame(report)
+
+
+def main():
+    tuning = argparse.ArgumentParser(add_help=False)
+    tuning.add_argument("--nlist", type=int)
+    tuning.add_argument("--nprobe", type=int)
+    tuning.add_argument("--hnsw-m", dest="hnsw_m", type=int)
+    tuning.add_argument("--ef-construction", dest="ef_construction", type=int)
+    tuning.add_argument("--ef-search", dest="ef_search", type=int)
+    tuning.add_argument("--pq-m", dest="pq_m", type=int)
+    tuning.add_argument("--pq-nbits", dest="pq_nbits", type=int)
+    tuning.add_argument("--quantization", choices=QUANTIZATIONS)
+    tuning.add_argument("--pca-dim", dest="pca_dim", type=int)
+
+    parser = argparse.ArgumentParser(description="Build or benchmark the MuseAI vectorstore.")
+    sub = parser.add_subparsers(dest="command")
+
+    build = sub.add_parser("build", parents=[tuning], help="Build/update the FAISS index (default).")
+    build.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE)
+    build.add_argument("--full-rebuild", action="store_true")
+    build.add_argument(
+        "--stream", action="store_true",
+        help="Chunked full build with bounded memory, for very large catalogs.",
     )
+    build.add_argument("--catalog", type=Path, help="CSV or Parquet catalog (--stream, default artifacts.csv)")
+    build.add_argument("--chunk-rows", dest="chunk_rows", type=int, default=STREAM_CHUNK_ROWS)
+    build.add_argument("--museum", help="Build this museum's shard (data/museums/<museum>/)")
+
+    bench = sub.add_parser("benchmark", parents=[tuning], help="Compare index types.")
+    bench.add_argument("--k", type=int, default=10)
+    bench.add_argument("--n-queries", type=int, default=200)
+    bench.add_argument("--queries", type=Path, help="CSV with a 'query' column")
+
+    versions = sub.add_parser("versions", help="List index builds (* = live).")
+    versions.add_argument("--museum")
+    activate = sub.add_parser("activate", help="Make an older/newer build live (rollback).")
+    activate.add_argument("version")
+    activate.add_argument("--museum")
+
+    args = parser.parse_args()
+    params = {
+        name: getattr(args, name)
+        for name in (
+            "nlist", "nprobe", "hnsw_m", "ef_construction", "ef_search",
+            "pq_m", "pq_nbits", "quantization", "pca_dim",
+        )
+        if getattr(args, name, None) is not None
+    }
+
+    data_dir = museum_dir(args.museum) if getattr(args, "museum", None) else None
+    if args.command == "versions":
+        live = current_version(data_dir)
+        for version in list_versions(data_dir):
+            manifest = json.loads(version_store_paths(version, data_dir).manifest.read_text())
+            print(
+                f"{'*' if version == live else ' '} {version}  "
+                f"{manifest['row_count']} rows  {manifest['index_type']}  {manifest['embedding_backend']}"
+            )
+    elif args.command == "activate":
+        activate_version(args.version, data_dir=data_dir)
+    elif args.command == "benchmark":
+        report = benchmark_vectorstore(
+            k=args.k,
+            n_queries=args.n_queries,
+            queries_path=args.queries,
+            index_params=params,
+        )
+        print(report.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    elif getattr(args, "stream", False):
+        stream_build_vectorstore(
+            catalog_path=args.catalog,
+            chunk_rows=args.chunk_rows,
+            index_type=args.index_type,
+            index_params=params,
+            museum=args.museum,
+        )
+    else:
+        build_and_save_vectorstore(
+            full_rebuild=getattr(args, "full_rebuild", False),
+            index_type=getattr(args, "index_type", INDEX_TYPE),
+            index_params=params,
+            museum=getattr(args, "museum", None),
+        )
+
+
+if __name__ == "__main__":
+    main()
 
 
 
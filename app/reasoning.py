@@ -1,32 +1,120 @@
-import os
-import vertexai
+import asyncio
+import weakref
+import threading
+
+import numpy as np
 
 from pathlib import Path
 from dotenv import load_dotenv
-from typing import Dict, Optional
-from vertexai.generative_models import GenerativeModel
-from app.rag import build_context_for_artifact_id, build_context_for_query
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from vertexai.generative_models import GenerationConfig, GenerativeModel
+from app.rag import (
+    build_context_for_artifact_id,
+    build_related_context,
+    context_chunks_for_query,
+    embed_query,
+    get_artifact,
+    get_embedder,
+    init_vertex,
+)
+from app.intents import INTENT_ROUTER_ENABLED, answer_intent, detect_intent
+from app.faq_bank import lookup_faq_answer
+from app.singleflight import SingleFlight
+from app.embedding_cache import normalize_text
+from app.answer_cache import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_SEMANTIC,
+    AnswerKey,
+    context_hash,
+    get_answer_cache,
+)
+from app.prompt_budget import (
+    CHUNK_SEPARATOR,
+    MIN_TRIMMED_CHUNK_TOKENS,
+    count_tokens,
+    fit_chunks,
+    prompt_token_budget,
+    record_usage,
+)
 
 
 # ===== Environment & Vertex config =====
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR / ".env")
 
-GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID")
-GCP_LOCATION = os.getenv("GCP_LOCATION", "us-central1")
 LLM_MODEL_NAME = "gemini-2.0-flash-001"   
 
 
-def init_vertex():
-    """Initialize Vertex AI once per process."""
-    if not GCP_PROJECT_ID:
-        raise RuntimeError("GCP_PROJECT_ID is missing from environment.")
-    vertexai.init(project=GCP_PROJECT_ID, location=GCP_LOCATION)
+# One Gemini handle per process: (model, credentials). GenerativeModel is
+# safe to share between Streamlit's script threads.
+_LLM = None
+_LLM_LOCK = threading.Lock()
+
+
+def _llm_is_fresh(llm) -> bool:
+    if llm is None:
+        return False
+    _, creds = llm
+    return not getattr(creds, "expired", False)
 
 
 def get_llm() -> GenerativeModel:
-    init_vertex()
-    return GenerativeModel(LLM_MODEL_NAME)
+    """
+    Return the shared Gemini model, creating it on first use.
+
+    Vertex is initialised with the same service-account credentials as the
+    embeddings (rag.init_vertex); init + model construction only run again
+    when those credentials report they have expired.
+    """
+    global _LLM
+
+    llm = _LLM
+    if _llm_is_fresh(llm):
+        return llm[0]
+
+    with _LLM_LOCK:
+        if not _llm_is_fresh(_LLM):
+            creds = init_vertex()
+            _LLM = (GenerativeModel(LLM_MODEL_NAME), creds)
+        return _LLM[0]
+
+
+# Async callers get a model object per event loop: the SDK keeps its async
+# gRPC channel on the model, and that channel is bound to the loop it was
+# created on. Vertex init / credentials are shared with get_llm().
+_ASYNC_LLMS: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+# Not _LLM_LOCK: get_llm() holds that one while loading credentials, and
+# waiting for it here would block the whole event loop
+_ASYNC_LLMS_LOCK = threading.Lock()
+
+
+async def get_llm_async() -> GenerativeModel:
+    """Gemini handle for the running event loop (see get_llm for refresh rules)."""
+    if not _llm_is_fresh(_LLM):
+        await asyncio.to_thread(get_llm)   # loads credentials – keep it off the loop
+
+    loop = asyncio.get_running_loop()
+    base = _LLM
+    with _ASYNC_LLMS_LOCK:
+        entry = _ASYNC_LLMS.get(loop)
+    if entry is None or entry[1] is not base:
+        # Only this loop's thread builds its entry, so no lock is needed here
+        entry = (GenerativeModel(LLM_MODEL_NAME), base)
+        with _ASYNC_LLMS_LOCK:
+            _ASYNC_LLMS[loop] = entry
+    return entry[0]
+
+
+def warm_up_llm():
+    """
+    Pay the Gemini cold start (Vertex init, model handle, first connection)
+    up front with a one-token request, e.g. when the Streamlit server boots.
+    """
+    get_llm().generate_content(
+        "Reply with OK.",
+        generation_config=GenerationConfig(max_output_tokens=1),
+    )
 
 
 # ===== Language switching helpers =====
@@ -49,49 +137,90 @@ def detect_language_switch(user_query: str) -> Optional[str]:
 
 
 # ===== Main reasoning function used by the app =====
-def museai_reason(
+SWITCH_CONFIRMATIONS = {
+    "en": "Okay, switching to English.",
+    "fr": "Très bien, je passe au français.",
+    "he": "בסדר, אנחנו עוברים לעברית."
+}
+
+
+def route_query(
     user_query: str,
     artifact_id: Optional[int],
-    language: str = "en",
-) -> Dict[str, str]:
+    language: str,
+) -> Optional[Dict[str, str]]:
     """
-    Central 'brain' for MuseAI.
-
-    - Checks if user wants to switch language.
-    - If artifact_id is known (from Vision), uses artifact-specific RAG.
-    - Otherwise, uses query-based RAG search.
-    - Calls Gemini to generate an answer in the current language.
+    Answers that need no LLM, or None to go on to Gemini:
 
-    Returns:
-        {
-          "answer": <string>,
-          "language": <"en" | "fr" | "he">
-        }
+    - language switch requests (canned confirmation)
+    - "where is it / what is it made of / how old is it" about a known
+      artifact, from its metadata columns (see intents.py)
     """
-
-    # Language switching
     switch = detect_language_switch(user_query)
     if switch:
-        new_lang = switch
-        confirmations = {
-            "en": "Okay, switching to English.",
-            "fr": "Très bien, je passe au français.",
-            "he": "בסדר, אנחנו עוברים לעברית."
-        }
         return {
-            "answer": confirmations[new_lang],
-            "language": new_lang,
+            "answer": SWITCH_CONFIRMATIONS[switch],
+            "language": switch,
         }
 
-    # Build RAG context
+    if not INTENT_ROUTER_ENABLED or artifact_id is None:
+        return None
+    intent = detect_intent(user_query)
+    if intent is None:
+        return None
+    artifact = get_artifact(artifact_id)
+    answer = answer_intent(intent, artifact, language) if artifact else None
+    if answer is None:
+        return None   # field missing for this artifact – let Gemini handle it
+    return {"answer": answer, "language": language}
+
+
+def rag_context_chunks(user_query: str, artifact_id: Optional[int]) -> List[str]:
+    """
+    - If artifact_id is known (from Vision), uses artifact-specific RAG,
+      plus a few related objects from the precomputed neighbour graph.
+    - Otherwise, uses query-based RAG search.
+
+    Chunks come most important first.
+    """
     if artifact_id is not None:
-        rag_context = build_context_for_artifact_id(artifact_id)
-    else:
-        rag_context = build_context_for_query(user_query, k=3)
+        chunks = [build_context_for_artifact_id(artifact_id)]
+        related = build_related_context(artifact_id, k=3)
+        if related:
+            chunks.append(related)
+        return chunks
+    return context_chunks_for_query(user_query, k=3)
+
+
+def prepare_rag_context(
+    user_query: str,
+    artifact_id: Optional[int],
+    language: str = "en",
+) -> Tuple[str, str]:
+    """
+    (prompt context, source context).
+
+    The prompt context is cut to what is left of the language's token
+    budget once the instructions and the question are counted (see
+    prompt_budget.py), so it varies with the question. The source context
+    is the untrimmed text it came from – what the answer cache hashes.
+    """
+    chunks = rag_context_chunks(user_query, artifact_id)
+    separator = "\n" if artifact_id is not None else CHUNK_SEPARATOR
+    overhead = count_tokens(build_prompt(user_query, "", language))
+    budget = max(prompt_token_budget(language) - overhead, MIN_TRIMMED_CHUNK_TOKENS)
+    return separator.join(fit_chunks(chunks, budget, separator)), separator.join(chunks)
+
+
+def build_rag_context(user_query: str, artifact_id: Optional[int], language: str = "en") -> str:
+    """RAG context for the prompt, within the language's token budget."""
+    return prepare_rag_context(user_query, artifact_id, language)[0]
 
+
+def build_prompt(user_query: str, rag_context: str, language: str) -> str:
     # Prompt for the LLM
     # - Use the museum context below as your primary source.
-    prompt = f"""
+    return f"""
 You are MuseAI, a multilingual museum guide.
 
 - Answer STRICTLY in this language: {language}.
@@ -111,15 +240,319 @@ User question:
 Now respond in a clear, friendly way.
 """
 
+
+def question_vector(user_query: str) -> Optional[np.ndarray]:
+    """
+    Question embedding for the semantic answer cache, or None if that is
+    off or the question can't be embedded (the answer is then simply generated).
+    """
+    if not (ANSWER_CACHE_ENABLED and ANSWER_CACHE_SEMANTIC):
+        return None
+    try:
+        return embed_query(user_query)
+    except Exception as e:
+        print(f"[reasoning.question_vector] Skipping answer cache: {e}")
+        return None
+
+
+# Embeds free-form questions for the answer cache while retrieval runs
+_QUESTION_VECTOR_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="question-vector")
+
+
+def deferred_question_vector(
+    user_query: str,
+    artifact_id: Optional[int],
+) -> Callable[[], Optional[np.ndarray]]:
+    """
+    The question embedding, to be fetched only if the exact answer-cache
+    lookup misses.
+
+    A free-form question is embedded right away, next to retrieval: dense
+    retrieval embeds the same text, and the two share one API call (embed
+    single-flight + embedding cache). A question about a known artifact
+    needs no retrieval embedding, so it is only embedded when called.
+    """
+    if artifact_id is None and ANSWER_CACHE_ENABLED and ANSWER_CACHE_SEMANTIC:
+        return _QUESTION_VECTOR_POOL.submit(question_vector, user_query).result
+    return lambda: question_vector(user_query)
+
+
+def answer_cache_key(
+    user_query: str,
+    artifact_id: Optional[int],
+    language: str,
+    source_context: str,
+    vector: Optional[np.ndarray] = None,
+) -> Optional[AnswerKey]:
+    """
+    Key for the answer cache (None = caching is off).
+
+    Hashes the untrimmed source context: the budgeted prompt context differs
+    with every question's length, and the cache drops an artifact's answers
+    when its context hash changes.
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    return AnswerKey(
+        model=get_embedder().name,
+        artifact_id=artifact_id,
+        language=language,
+        context_hash=context_hash(source_context),
+        question=user_query,
+        vector=vector,
+    )
+
+
+def lookup_cached_answer(
+    user_query: str,
+    artifact_id: Optional[int],
+    language: str,
+    source_context: str,
+    vector: Callable[[], Optional[np.ndarray]],
+) -> Tuple[Optional[str], Optional[AnswerKey]]:
+    """
+    (cached answer or None, key to store a fresh answer under).
+
+    The same question (normalised) is looked up first, without embedding;
+    only on a miss is `vector()` fetched for the similarity lookup.
+    """
+    key = answer_cache_key(user_query, artifact_id, language, source_context)
+    if key is None:
+        return None, None
+
+    cache = get_answer_cache()
+    cached = cache.get_exact(key)
+    if cached is not None:
+        return cached, key
+
+    key = key._replace(vector=vector())
+    return cache.get(key), key
+
+
+# Coalesces identical concurrent museai_reason / museai_reason_stream calls
+_REASON_FLIGHTS = SingleFlight("reason")
+
+
+def _flight_key(user_query: str, artifact_id: Optional[int], language: str):
+    return (normalize_text(user_query), artifact_id, language)
+
+
+def museai_reason(
+    user_query: str,
+    artifact_id: Optional[int],
+    language: str = "en",
+) -> Dict[str, str]:
+    """
+    Central 'brain' for MuseAI.
+
+    - Checks if user wants to switch language, or asks a plain metadata
+      question (location / material / period) answered without the LLM.
+    - Serves a pre-generated answer if the question is one of the FAQ
+      bank's canonical questions for this artifact (see faq_bank.py).
+    - Builds RAG context within the language's token budget (see build_rag_context).
+    - Serves a cached answer if the same (or, after embedding the question,
+      a similar) question about the same context was already answered in
+      this language (see answer_cache.py).
+    - Otherwise calls Gemini to generate an answer in the current language.
+    - The same question, about the same artifact, in the same language,
+      asked while an identical request is in flight (a school group)
+      waits for that request and shares its answer.
+
+    Returns:
+        {
+          "answer": <string>,
+          "language": <"en" | "fr" | "he">
+        }
+    """
+    key = _flight_key(user_query, artifact_id, language)
+    return dict(_REASON_FLIGHTS.do(key, _reason, user_query, artifact_id, language))
+
+
+def _reason(user_query: str, artifact_id: Optional[int], language: str) -> Dict[str, str]:
+    # Language switching / metadata questions
+    routed = route_query(user_query, artifact_id, language)
+    if routed:
+        return routed
+
+    banked = lookup_faq_answer(user_query, artifact_id, language)
+    if banked is not None:
+        return {"answer": banked, "language": language}
+
+    vector = deferred_question_vector(user_query, artifact_id)
+    rag_context, source_context = prepare_rag_context(user_query, artifact_id, language)
+    cached, cache_key = lookup_cached_answer(user_query, artifact_id, language, source_context, vector)
+    if cached is not None:
+        return {"answer": cached, "language": language}
+
+    prompt = build_prompt(user_query, rag_context, language)
+
     model = get_llm()
     response = model.generate_content(prompt)
+    answer = response.text.strip()
+    record_usage(response, language, count_tokens(prompt), count_tokens(rag_context))
+
+    if cache_key is not None:
+        get_answer_cache().put(cache_key, answer)
 
     return {
-        "answer": response.text.strip(),
+        "answer": answer,
         "language": language,
     }
 
 
+def museai_reason_stream(
+    user_query: str,
+    artifact_id: Optional[int],
+    language: str = "en",
+) -> Iterator[Dict[str, str]]:
+    """
+    Streaming version of museai_reason() for the UI.
+
+    Yields {"delta": <text>, "language": <lang>} as Gemini produces the
+    answer, so the first words (and first sentences of speech) are ready
+    after time-to-first-token instead of after the whole answer.
+    Joining the deltas gives the full answer. A cached, banked or routed
+    answer comes back as a single delta.
+
+    Identical in-flight requests share one Gemini stream: it is produced on
+    a background thread and every caller replays it, so the answer is also
+    completed (and cached) if the visitor who started it walks away.
+    """
+    key = _flight_key(user_query, artifact_id, language)
+    return _REASON_FLIGHTS.stream(key, _reason_stream, user_query, artifact_id, language)
+
+
+def _reason_stream(
+    user_query: str,
+    artifact_id: Optional[int],
+    language: str,
+) -> Iterator[Dict[str, str]]:
+    routed = route_query(user_query, artifact_id, language)
+    if routed:
+        yield {"delta": routed["answer"], "language": routed["language"]}
+        return
+
+    banked = lookup_faq_answer(user_query, artifact_id, language)
+    if banked is not None:
+        yield {"delta": banked, "language": language}
+        return
+
+    vector = deferred_question_vector(user_query, artifact_id)
+    rag_context, source_context = prepare_rag_context(user_query, artifact_id, language)
+    cached, cache_key = lookup_cached_answer(user_query, artifact_id, language, source_context, vector)
+    if cached is not None:
+        yield {"delta": cached, "language": language}
+        return
+
+    prompt = build_prompt(user_query, rag_context, language)
+
+    started = False
+    parts = []
+    chunk = None
+    for chunk in get_llm().generate_content(prompt, stream=True):
+        try:
+            text = chunk.text
+        except ValueError:
+            continue   # chunk without text (e.g. only finish reason / safety ratings)
+
+        if not started:
+            text = text.lstrip()
+            started = bool(text)
+        if text:
+            parts.append(text)
+            yield {"delta": text, "language": language}
+
+    # The last chunk carries the token counts for the whole request
+    if chunk is not None:
+        record_usage(chunk, language, count_tokens(prompt), count_tokens(rag_context))
+
+    # Only complete answers are cached
+    answer = "".join(parts).strip()
+    if cache_key is not None and answer:
+        get_answer_cache().put(cache_key, answer)
+
+
+async def museai_reason_async(
+    user_query: str,
+    artifact_id: Optional[int],
+    language: str = "en",
+) -> Dict[str, str]:
+    """
+    asyncio-native museai_reason(), for serving many sessions on one loop.
+
+    - RAG context, the question embedding (semantic answer-cache key, for
+      free-form questions) and the Gemini handle are prepared concurrently
+      instead of one after the other.
+    - The Gemini call goes through the SDK's async client, so no thread is
+      parked for the seconds the answer takes to generate.
+    - Cancelling the task (e.g. the visitor asked something new, see
+      ReasoningSession) aborts the in-flight request; nothing is cached.
+
+    Returns the same dict as museai_reason().
+    """
+    # Off the loop: a metadata question may be the first to touch the store
+    # (FAISS + parquet load), and the FAQ match may embed the question
+    routed = await asyncio.to_thread(route_query, user_query, artifact_id, language)
+    if routed:
+        return routed
+
+    banked = await asyncio.to_thread(lookup_faq_answer, user_query, artifact_id, language)
+    if banked is not None:
+        return {"answer": banked, "language": language}
+
+    # Retrieval + embedding are blocking library calls: short, run in threads
+    vector = deferred_question_vector(user_query, artifact_id)
+    (rag_context, source_context), model = await asyncio.gather(
+        asyncio.to_thread(prepare_rag_context, user_query, artifact_id, language),
+        get_llm_async(),
+    )
+
+    cached, cache_key = await asyncio.to_thread(
+        lookup_cached_answer, user_query, artifact_id, language, source_context, vector,
+    )
+    if cached is not None:
+        return {"answer": cached, "language": language}
+
+    prompt = build_prompt(user_query, rag_context, language)
+    response = await model.generate_content_async(prompt)
+    answer = response.text.strip()
+    record_usage(response, language, count_tokens(prompt), count_tokens(rag_context))
+
+    if cache_key is not None:
+        await asyncio.to_thread(get_answer_cache().put, cache_key, answer)
+
+    return {
+        "answer": answer,
+        "language": language,
+    }
+
+
+class ReasoningSession:
+    """
+    One visitor's conversation on an event loop: asking a new question
+    cancels the answer still being generated for the previous one.
+    """
+
+    def __init__(self):
+        self._current: Optional[asyncio.Task] = None
+
+    async def ask(
+        self,
+        user_query: str,
+        artifact_id: Optional[int],
+        language: str = "en",
+    ) -> Dict[str, str]:
+        """museai_reason_async(); raises CancelledError if superseded by a newer ask()."""
+        self.cancel()
+        task = asyncio.create_task(museai_reason_async(user_query, artifact_id, language))
+        self._current = task
+        return await task
+
+    def cancel(self):
+        if self._current is not None and not self._current.done():
+            self._current.cancel()
+
+
 
 
 
@@ -0,0 +1,127 @@
+"""
+Request coalescing ("single flight") for MuseAI.
+
+When a school group scans the same artifact and asks the same question
+within seconds, every session used to call Gemini, the embedding API and
+ElevenLabs on its own. A SingleFlight lets the first caller for a key do
+the work while concurrent callers with the same key wait for it and share
+the result (or the exception). Nothing is kept once the call finishes –
+caching is the answer/embedding caches' job; this only flattens spikes of
+identical in-flight requests.
+
+- do(key, fn, ...)      – plain calls
+- stream(key, fn, ...)  – generators: one producer thread fills a shared
+  buffer, every caller replays it as it grows, so a visitor leaving early
+  doesn't cut the answer short for the others
+"""
+
+import threading
+
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _SharedStream:
+    def __init__(self):
+        self.items: List[Any] = []
+        self.finished = False
+        self.error: Optional[BaseException] = None
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one execution."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0      # executions actually run
+        self.shared = 0     # callers served by someone else's execution
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, _Call] = {}
+        self._streams: Dict[Hashable, _SharedStream] = {}
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._inflight[key] = call
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+
+    def stream(self, key: Hashable, fn: Callable[..., Iterator], *args, **kwargs) -> Iterator:
+        with self._lock:
+            shared = self._streams.get(key)
+            if shared is None:
+                shared = _SharedStream()
+                self._streams[key] = shared
+                self.calls += 1
+                threading.Thread(
+                    target=self._produce,
+                    args=(key, shared, fn, args, kwargs),
+                    name=f"singleflight-{self.name}",
+                    daemon=True,
+                ).start()
+            else:
+                self.shared += 1
+
+        i = 0
+        while True:
+            with shared.cond:
+                while i == len(shared.items) and not shared.finished:
+                    shared.cond.wait()
+                items = shared.items[i:]
+                finished = shared.finished
+            for item in items:
+                yield item
+            i += len(items)
+            if finished and i == len(shared.items):
+                break
+
+        if shared.error is not None:
+            raise shared.error
+
+    def _produce(self, key: Hashable, shared: _SharedStream, fn, args, kwargs):
+        try:
+            for item in fn(*args, **kwargs):
+                with shared.cond:
+                    shared.items.append(item)
+                    shared.cond.notify_all()
+        except BaseException as e:
+            shared.error = e
+        finally:
+            # Late arrivals start a fresh call instead of joining a finished one
+            with self._lock:
+                del self._streams[key]
+            with shared.cond:
+                shared.finished = True
+                shared.cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared}
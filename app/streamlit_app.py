@@ -1,5 +1,6 @@
 import os
 import sys
+import threading
 from pathlib import Path
 
 # --- make sure the project root is on sys.path (needed on Streamlit Cloud) ---
@@ -11,8 +12,9 @@ import streamlit as st
 
 from app.vision import classify_artifact_from_image
 from app.voice import transcribe_and_detect_language, LanguageCode
-from app.reasoning import museai_reason
-from app.tts import tts_generate_audio
+from app.reasoning import museai_reason_stream, warm_up_llm
+from app.tts import StreamingSpeech
+from app.rag import warm_up_embeddings
 
 # ------------------------------------------------------------------------------------
 # Basic config
@@ -613,45 +615,75 @@ def render_conversation_area():
             "I’ll answer in English for now.\n\n"
         )
 
+    # Stream the answer into its bubble as Gemini writes it; finished
+    # sentences are already being turned into speech meanwhile.
+    speech = StreamingSpeech(language=reply_language)
+    speech.feed(notice_prefix)   # notice for unsupported languages, if any
+    answer_text = notice_prefix
+    bubble = st.empty()
+
     with st.spinner("Thinking about the best answer…"):
-        llm_raw = museai_reason(
+        for chunk in museai_reason_stream(
             user_query=transcript,
             artifact_id=artifact_id,
             language=reply_language,
-        )
-
-    if isinstance(llm_raw, dict) and "language" in llm_raw:
-        st.session_state.language = llm_raw["language"]
-
-    # Handle both string or dict response from museai_reason
-    if isinstance(llm_raw, dict):
-        answer_text = (
-            llm_raw.get("answer")
-            or llm_raw.get("text")
-            or str(llm_raw)
-        )
-    else:
-        answer_text = str(llm_raw)
+        ):
+            st.session_state.language = chunk["language"]
+            answer_text += chunk["delta"]
+            speech.feed(chunk["delta"])
+            bubble.markdown(
+                f"<div class='bubble-assistant'>🤖 {answer_text}▌</div>",
+                unsafe_allow_html=True,
+            )
 
-    # Add any notice prefix (for unsupported languages)
-    answer_text = notice_prefix + answer_text
+    bubble.markdown(
+        f"<div class='bubble-assistant'>🤖 {answer_text}</div>",
+        unsafe_allow_html=True,
+    )
 
     # Add assistant message to chat
     st.session_state.chat.append({"role": "assistant", "text": answer_text})
 
-    # Text → speech
+    # Text → speech (only the last sentences are still being synthesised)
     with st.spinner("Preparing audio answer…"):
-        audio_out_path = tts_generate_audio(
-            text=answer_text,
-            language=reply_language,
-        )
-        st.session_state.last_audio_path = audio_out_path
+        st.session_state.last_audio_path = speech.finish()
 
     st.success("New answer from MuseAI 👇")
     if st.session_state.last_audio_path:
         st.audio(st.session_state.last_audio_path)
 
 
+# ------------------------------------------------------------------------------------
+# Backend warm-up
+# ------------------------------------------------------------------------------------
+def _warm_up_backends():
+    """
+    Pays the Vertex / Gemini cold start off the request path. Failures are
+    logged, not fatal – the normal request path will retry on its own.
+    """
+    try:
+        warm_up_embeddings()
+    except Exception as e:
+        print(f"[streamlit_app.warm_up_backends] Embedding warm-up failed: {e}")
+    try:
+        warm_up_llm()
+    except Exception as e:
+        print(f"[streamlit_app.warm_up_backends] Gemini warm-up failed: {e}")
+
+
+@st.cache_resource(show_spinner=False)
+def warm_up_backends() -> threading.Thread:
+    """
+    Starts the warm-up once per server process (cache_resource) on a
+    background thread, so the first visitor's page renders right away
+    instead of waiting for it. A question asked before it finishes just
+    shares the same one-time init (get_llm / get_embedder are locked).
+    """
+    thread = threading.Thread(target=_warm_up_backends, name="museai-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
 # ------------------------------------------------------------------------------------
 # Main app
 # ------------------------------------------------------------------------------------
@@ -665,6 +697,7 @@ def main():
 
     apply_global_styles()
     init_session_state()
+    warm_up_backends()
 
     # Top bar (logo + language) – always visible
     render_top_bar()
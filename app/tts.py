@@ -4,16 +4,26 @@ Handles multilingual text-to-speech using ElevenLabs v3 with a unified voice.
 """
 
 import os
+import re
+import sys
 import streamlit as st
 
 from pathlib import Path
 from dotenv import load_dotenv
+from typing import List
+from concurrent.futures import Future, ThreadPoolExecutor
 from elevenlabs import ElevenLabs, VoiceSettings
 
 # === Paths & env ===
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR / ".env")
 
+# make sure the project root is on sys.path (for `python app/tts.py`)
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from app.singleflight import SingleFlight
+
 # Try local .env first (for your laptop), then Streamlit Cloud secrets
 ELEVEN_API_KEY = (
     os.getenv("ELEVENLABS_API_KEY")
@@ -32,18 +42,27 @@ if not VOICE_ID_MULTI:
 
 client = ElevenLabs(api_key=ELEVEN_API_KEY)
 
+OUTPUT_DIR = BASE_DIR / "data" / "audio_output"
 
-def tts_generate_audio(text: str, language: str = "en") -> str:
-    """
-    Generate multilingual speech using ElevenLabs v3.
-    One universal multilingual voice ID.
-    """
-    
-    output_dir = BASE_DIR / "data" / "audio_output"
-    output_dir.mkdir(exist_ok=True, parents=True)
+# Streaming answers: complete sentences are synthesised while the LLM is
+# still writing. Segments are at least this long (fewer, more natural
+# sounding requests) and a few per answer run in parallel.
+TTS_SEGMENT_MIN_CHARS = 120
+TTS_MAX_PARALLEL = 2   # per StreamingSpeech, so sessions don't queue behind each other
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+# Sessions speaking the same text at the same moment share one request
+_TTS_FLIGHTS = SingleFlight("tts")
 
-    out_path = output_dir / f"tts_{language}.mp3"
 
+def _synthesize(text: str) -> bytes:
+    """mp3 bytes for `text`; identical concurrent requests share one ElevenLabs call."""
+    return _TTS_FLIGHTS.do(" ".join(text.split()), _convert, text)
+
+
+def _convert(text: str) -> bytes:
+    """One ElevenLabs v3 request, returned as mp3 bytes."""
     audio_stream = client.text_to_speech.convert(
         voice_id=VOICE_ID_MULTI,
         model_id="eleven_v3",
@@ -57,13 +76,67 @@ def tts_generate_audio(text: str, language: str = "en") -> str:
         )
     )
 
-    with open(out_path, "wb") as f:
-        for chunk in audio_stream:
-            f.write(chunk)
+    return b"".join(audio_stream)
+
 
+def tts_generate_audio(text: str, language: str = "en") -> str:
+    """
+    Generate multilingual speech using ElevenLabs v3.
+    One universal multilingual voice ID.
+    """
+    OUTPUT_DIR.mkdir(exist_ok=True, parents=True)
+    out_path = OUTPUT_DIR / f"tts_{language}.mp3"
+    out_path.write_bytes(_synthesize(text))
     return str(out_path)
 
 
+class StreamingSpeech:
+    """
+    Speech for an answer that is still being generated.
+
+    feed() the text deltas as they arrive; each time enough complete
+    sentences have accumulated they are sent to ElevenLabs in the
+    background. finish() synthesises the remainder and writes all segments,
+    in order, to one mp3 (mp3 frames concatenate cleanly), so the audio is
+    ready soon after the last token instead of a full TTS pass later.
+    """
+
+    def __init__(self, language: str = "en"):
+        self.language = language
+        self._pending = ""
+        self._segments: List[Future] = []
+        self._pool = ThreadPoolExecutor(max_workers=TTS_MAX_PARALLEL, thread_name_prefix="tts")
+
+    def feed(self, delta: str):
+        self._pending += delta
+        parts = _SENTENCE_END.split(self._pending)
+        if len(parts) < 2:
+            return
+
+        # Everything but the last part ends with a full sentence
+        complete = " ".join(parts[:-1])
+        if len(complete) >= TTS_SEGMENT_MIN_CHARS:
+            self._segments.append(self._pool.submit(_synthesize, complete))
+            self._pending = parts[-1]
+
+    def finish(self) -> str:
+        """Wait for all segments and return the path of the joined mp3."""
+        rest = self._pending.strip()
+        if rest:
+            self._segments.append(self._pool.submit(_synthesize, rest))
+            self._pending = ""
+
+        OUTPUT_DIR.mkdir(exist_ok=True, parents=True)
+        out_path = OUTPUT_DIR / f"tts_{self.language}.mp3"
+        try:
+            with open(out_path, "wb") as f:
+                for segment in self._segments:
+                    f.write(segment.result())
+        finally:
+            self._pool.shutdown(wait=False)
+        return str(out_path)
+
+
 if __name__ == "__main__":
     demo_path = tts_generate_audio("Hello from MuseAI test.", language="en")
     print("Generated demo audio at:", demo_path)